@@ -0,0 +1,136 @@
+"""
+Article -> chunk-id index built at ingest.
+
+"article 8222 details" names its answer set outright, so it doesn't need a
+query embedding or hybrid ranking. Ingestion writes one small object per
+article listing that article's chunk ids (with stage and class) in the order
+a fabric moves through the mill; the retrievers read it and fetch the chunks
+by id. Objects are overwritten on re-ingest; entries of articles that no
+longer exist are never read, because the retrievers only look up
+`known_articles` from the index metadata.
+"""
+
+from article_summaries import section_rank
+
+ARTICLE_INDEX_CLASS_NAME = "TextileArticleIndex"
+
+
+def article_index_uuid(class_name, article):
+    from weaviate.util import generate_uuid5
+
+    return generate_uuid5(f"{class_name}:{article}", "article-index")
+
+
+def ensure_article_index_class(client):
+    if client.schema.exists(ARTICLE_INDEX_CLASS_NAME):
+        return
+    client.schema.create_class(
+        {
+            "class": ARTICLE_INDEX_CLASS_NAME,
+            "vectorizer": "none",
+            "vectorIndexConfig": {"skip": True},
+            "properties": [
+                {"name": "index_class", "dataType": ["text"], "tokenization": "field"},
+                {"name": "article", "dataType": ["text"], "tokenization": "field"},
+                # Parallel lists, in stage order
+                {"name": "chunk_ids", "dataType": ["text[]"], "indexFilterable": False},
+                {"name": "stages", "dataType": ["text[]"], "indexFilterable": False},
+                {"name": "classes", "dataType": ["text[]"], "indexFilterable": False},
+            ],
+        }
+    )
+
+
+class ArticleIndexBuilder:
+    """Collects (stage, class, uuid) of every detail chunk per article."""
+
+    def __init__(self, class_name):
+        self.class_name = class_name
+        self.articles = {}
+
+    def add(self, record, uuid, class_name=None):
+        if record.get("doc_type", "chunk") != "chunk":
+            return
+        # BOM / Quality chunks have no stage; they sort by source instead
+        order = section_rank(record.get("stage") or record.get("source") or "")
+        self.articles.setdefault(record["article"], []).append(
+            (order, record.get("stage") or "", class_name or self.class_name, str(uuid))
+        )
+
+    def records(self):
+        """Yield (uuid, record) for every article."""
+        for article, entries in self.articles.items():
+            # Stable sort: ingest order within a stage
+            entries = sorted(entries, key=lambda entry: entry[0])
+            yield article_index_uuid(self.class_name, article), {
+                "index_class": self.class_name,
+                "article": article,
+                "chunk_ids": [entry[3] for entry in entries],
+                "stages": [entry[1] for entry in entries],
+                "classes": [entry[2] for entry in entries],
+            }
+
+
+def read_article_chunks(client, class_name, articles):
+    """Per article, [(chunk_id, stage, class)] in stage order."""
+    entries = []
+    for article in articles:
+        try:
+            obj = client.data_object.get_by_id(
+                article_index_uuid(class_name, article),
+                class_name=ARTICLE_INDEX_CLASS_NAME,
+            )
+        except Exception:
+            obj = None
+        props = (obj or {}).get("properties") or {}
+        entries.append(
+            list(
+                zip(
+                    props.get("chunk_ids") or [],
+                    props.get("stages") or [],
+                    props.get("classes") or [],
+                )
+            )
+        )
+    return entries
+
+
+def export_article_index(client, class_name, page_size=500):
+    """{uuid: properties} of every article-index object of `class_name`.
+
+    The cursor API can't filter, but the class holds one small object per
+    article, so paging through all of it is cheap.
+    """
+    if not client.schema.exists(ARTICLE_INDEX_CLASS_NAME):
+        return {}
+    objects = {}
+    after = None
+    while True:
+        query = (
+            client.query.get(
+                ARTICLE_INDEX_CLASS_NAME,
+                ["index_class", "article", "chunk_ids", "stages", "classes"],
+            )
+            .with_additional(["id"])
+            .with_limit(page_size)
+        )
+        if after:
+            query = query.with_after(after)
+        response = query.do()
+        page = response.get("data", {}).get("Get", {}).get(ARTICLE_INDEX_CLASS_NAME)
+        if not page:
+            return objects
+        for obj in page:
+            after = obj.pop("_additional")["id"]
+            if obj.get("index_class") == class_name:
+                objects[after] = obj
+
+
+def import_article_index_objects(client, objects):
+    """Create or overwrite article-index objects exported above."""
+    ensure_article_index_class(client)
+    for uuid, properties in objects.items():
+        if client.data_object.exists(uuid, class_name=ARTICLE_INDEX_CLASS_NAME):
+            client.data_object.replace(properties, ARTICLE_INDEX_CLASS_NAME, uuid)
+        else:
+            client.data_object.create(properties, ARTICLE_INDEX_CLASS_NAME, uuid=uuid)
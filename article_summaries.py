@@ -0,0 +1,179 @@
+"""
+Per-article summary documents built at ingest.
+
+"Tell me about article 8222" used to pull dozens of fragments into the
+prompt. Ingestion now also writes one compact summary per article (stages in
+route order with the parameter values recorded for each, plus BOM and
+quality coverage), indexed next to the detail chunks with doc_type="summary".
+The retrievers answer broad article questions from these summaries plus a
+few detail chunks.
+"""
+
+import re
+
+SUMMARY_SOURCE = "Summary"
+SUMMARY_MAX_PARAMETERS = 20  # per section
+SUMMARY_MAX_VALUES = 3  # distinct values kept per parameter
+SUMMARY_VALUE_CHARS = 40
+SUMMARY_SNIPPET_CHARS = 240  # first chunk of each section, as an example
+SUMMARY_MAX_CHARS = 4000
+SUMMARY_DETAIL_K = 8  # detail chunks retrieved alongside the summaries
+
+# Sections appear in the order a fabric moves through the mill
+SECTION_ORDER = [
+    "warping",
+    "beaming",
+    "sizing",
+    "weaving",
+    "griege",
+    "processing",
+    "dye",
+    "print",
+    "coating",
+    "finishing",
+    "bom",
+    "quality",
+]
+
+
+def section_rank(name):
+    """Position of a stage / source name in SECTION_ORDER (unknown last)."""
+    name = name.lower()
+    for rank, keyword in enumerate(SECTION_ORDER):
+        if keyword in name:
+            return rank
+    return len(SECTION_ORDER)
+
+
+def summary_uuid(article):
+    from weaviate.util import generate_uuid5
+
+    return generate_uuid5(article, "article-summary")
+
+
+_value_patterns = {}
+
+
+def parameter_value(content, parameter):
+    """Value written after `parameter` in a chunk sentence, or "".
+
+    Chunks read "total ends 6480; warping m/c speed 600" or "Beam Speed is
+    set to 40 to 60, ..."; the value runs up to the next , ; or sentence end.
+    """
+    pattern = _value_patterns.get(parameter)
+    if pattern is None:
+        pattern = _value_patterns[parameter] = re.compile(
+            rf"(?<!\w){re.escape(parameter)}(?!\w)\s*(?:is set to|is|:|=|-)?\s*"
+            r"([^,;\n]+?)\s*(?=[,;\n]|\.\s|\.$|$)",
+            re.IGNORECASE,
+        )
+    match = pattern.search(content)
+    return match.group(1)[:SUMMARY_VALUE_CHARS] if match else ""
+
+
+def is_broad_article_query(processes, parameters, articles):
+    """Article(s) named without a specific stage or parameter."""
+    return bool(articles) and not processes and not parameters
+
+
+class ArticleSummaryBuilder:
+    """Accumulates prepared chunk records into one summary per article.
+
+    Memory is bounded per article: parameters and their distinct values are
+    capped and only the first snippet of each section is kept.
+    """
+
+    def __init__(self):
+        self.articles = {}
+
+    def add(self, record):
+        article = self.articles.setdefault(
+            record["article"],
+            {
+                "full_article": "",
+                "sources": {},
+                "fibres": {},
+                "machines": {},
+                "sections": {},
+                "chunks": 0,
+            },
+        )
+        article["chunks"] += 1
+        if record.get("full_article") and not article["full_article"]:
+            article["full_article"] = record["full_article"]
+        if record.get("source"):
+            article["sources"][record["source"]] = None
+        for fibre in record.get("fibres") or []:
+            article["fibres"][fibre] = None
+        if record.get("machine"):
+            article["machines"][record["machine"]] = None
+
+        # BOM / Quality chunks have no stage; group them by source instead
+        name = record.get("stage") or record.get("source") or "general"
+        section = article["sections"].setdefault(
+            name, {"parameters": {}, "snippet": "", "chunks": 0}
+        )
+        section["chunks"] += 1
+        for param in record.get("parameter_names") or []:
+            values = section["parameters"].get(param)
+            if values is None:
+                if len(section["parameters"]) >= SUMMARY_MAX_PARAMETERS:
+                    continue
+                values = section["parameters"][param] = {}
+            if len(values) < SUMMARY_MAX_VALUES:
+                value = parameter_value(record.get("content", ""), param)
+                if value:
+                    values[value] = None
+        if not section["snippet"]:
+            section["snippet"] = " ".join(record.get("content", "").split())[
+                :SUMMARY_SNIPPET_CHARS
+            ]
+
+    def _render(self, article_no, article):
+        lines = [f"Summary of article {article_no}"]
+        if article["full_article"]:
+            lines[0] += f" ({article['full_article']})"
+        lines[0] += f": {article['chunks']} records."
+        if article["sources"]:
+            lines.append(f"Sources: {', '.join(article['sources'])}.")
+        if article["fibres"]:
+            lines.append(f"Fibres: {', '.join(article['fibres'])}.")
+        if article["machines"]:
+            lines.append(f"Machines: {', '.join(article['machines'])}.")
+
+        sections = sorted(
+            article["sections"].items(),
+            key=lambda item: section_rank(item[0]),
+        )
+        for name, section in sections:
+            label = name if name[:1].isupper() else name.title()
+            line = f"{label} ({section['chunks']} records)"
+            if section["parameters"]:
+                line += ": " + ", ".join(
+                    f"{param}: {' / '.join(values)}" if values else param
+                    for param, values in section["parameters"].items()
+                )
+            # The values already say what the section holds
+            if section["snippet"] and not any(section["parameters"].values()):
+                line += f". e.g. {section['snippet']}"
+            lines.append(line)
+        return "\n".join(lines)[:SUMMARY_MAX_CHARS]
+
+    def records(self):
+        """Yield (uuid, record) for every article summary."""
+        for article_no, article in self.articles.items():
+            parameter_names = {}
+            for section in article["sections"].values():
+                parameter_names.update(section["parameters"])
+            yield summary_uuid(article_no), {
+                "content": self._render(article_no, article),
+                "article": article_no,
+                "stage": "",
+                "parameter_names": list(parameter_names),
+                "doc_type": "summary",
+                "source": SUMMARY_SOURCE,
+                "sheet": "",
+                "full_article": article["full_article"],
+                "machine": "",
+                "fibres": list(article["fibres"]),
+            }
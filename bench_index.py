@@ -0,0 +1,520 @@
+"""
+Index benchmarks against a local Weaviate.
+
+Vectors and properties are copied from the live chunk class (no model
+inference for the corpus), written into throwaway benchmark classes with
+different index settings, and queried with a fixed query set. Recall@k is
+measured against exact brute-force cosine search over the same vectors;
+the hybrid `retrieve` path is compared against a flat (exact) copy of the
+class, so filters and BM25 are identical on both sides.
+
+Usage:
+    python bench_index.py compression               # none vs pq vs bq
+    python bench_index.py filters                   # inverted-index tuning
+    python bench_index.py hnsw --ef 32 64 128 --ef-construction 64 128 \
+        --max-connections 16 32                     # HNSW parameter sweep
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+
+import numpy as np
+from weaviate import Client as WeaviateClient
+
+from core_embedding import (
+    CLASS_NAME,
+    PQ_SEGMENTS,
+    RESCORE_LIMIT,
+    WEAVIATE_URL,
+    BatchImporter,
+    build_vector_index_config,
+    create_schema,
+    enable_deferred_pq,
+)
+from embedding_backends import get_embedder
+from retrieval_utils import class_property_names
+
+VECTOR_DIMS = 384
+DEFAULT_MAX_CONNECTIONS = 32  # Weaviate's HNSW default
+
+BENCH_QUERIES = [
+    "tell me about article 8222",
+    "warp denier of 8222",
+    "what is the warp denier for article 8222",
+    "beaming speed and reed pitch of article 8090",
+    "coating gsm of article 8228",
+    "sizing details of article 8222",
+    "processing temperature of article 8090",
+    "compare weaving parameters of 8222 vs 8090",
+    "total ends of warp for article 8228",
+    "steam pressure during ageing",
+    "dyeing and washing route",
+    "quality testing after coating",
+    "which machine is used in processing",
+    "weft arrival timing in weaving",
+    "drying temperature and speed",
+    "pigment printing parameters",
+]
+
+
+# ---------- HELPERS ---------- #
+def load_queries(path=None):
+    """Queries from a JSON list / text file (one per line), or the built-ins."""
+    if not path:
+        return BENCH_QUERIES
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return [line.strip() for line in f if line.strip()]
+
+
+def fetch_objects(client, class_name=CLASS_NAME, page_size=500, limit=None):
+    """Page through a class with the cursor API: (ids, vectors, properties).
+
+    Only detail chunks are copied; article summaries are never ranked by a
+    plain search in production. The cursor API can't filter, so they are
+    skipped here.
+    """
+    ids, vectors, properties = [], [], []
+    property_names = sorted(class_property_names(client, class_name))
+    after = None
+    while True:
+        query = (
+            client.query.get(class_name, property_names)
+            .with_additional(["id", "vector"])
+            .with_limit(page_size)
+        )
+        if after:
+            query = query.with_after(after)
+        page = query.do().get("data", {}).get("Get", {}).get(class_name) or []
+        if not page:
+            break
+        for obj in page:
+            extra = obj.pop("_additional")
+            after = extra["id"]
+            if obj.get("doc_type", "chunk") != "chunk":
+                continue
+            ids.append(extra["id"])
+            vectors.append(extra["vector"])
+            properties.append(obj)
+        if limit and len(ids) >= limit:
+            break
+    return ids, np.asarray(vectors, dtype=np.float32), properties
+
+
+def brute_force_topk(vectors, query_vectors, k):
+    """Exact top-k by cosine similarity (row indexes)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.clip(norms, 1e-12, None)
+    scores = query_vectors @ unit.T
+    top = np.argpartition(-scores, min(k, len(vectors) - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall_at_k(found_ids, truth_ids):
+    truth = set(truth_ids)
+    return len(truth.intersection(found_ids)) / len(truth) if truth else 1.0
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def latency_summary(latencies_ms):
+    return {
+        "p50_ms": round(statistics.median(latencies_ms), 2) if latencies_ms else 0.0,
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+    }
+
+
+def heap_inuse_bytes(metrics_url):
+    """Weaviate Go heap in use from its Prometheus endpoint, if reachable."""
+    if not metrics_url:
+        return None
+    import urllib.request
+
+    try:
+        with urllib.request.urlopen(metrics_url, timeout=5) as response:
+            for line in response.read().decode().splitlines():
+                if line.startswith("go_memstats_heap_inuse_bytes"):
+                    return float(line.split()[-1])
+    except OSError:
+        return None
+    return None
+
+
+def copy_into_class(
+    client,
+    class_name,
+    ids,
+    vectors,
+    properties,
+    vector_index_config,
+    vector_index_type="hnsw",
+    tuned_inverted_index=True,
+):
+    """Create a benchmark class with the given index config and bulk-load it."""
+    create_schema(
+        client,
+        class_name,
+        vector_index_config,
+        vector_index_type,
+        tuned_inverted_index=tuned_inverted_index,
+    )
+    importer = BatchImporter(
+        client, class_name=class_name, journal_file=f"{class_name}_failed.jsonl"
+    )
+    with importer:
+        for uuid, vector, props in zip(ids, vectors, properties):
+            importer.add(props, vector, uuid)
+    enable_deferred_pq(client, class_name, vector_index_config)
+    print(f"   {importer.report()}")
+
+
+def wait_for_compression(client, class_name, timeout=600):
+    """Poll node status until every shard of the class reports compressed."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            nodes = client.cluster.get_nodes_status(output="verbose")
+        except Exception:
+            print("⚠️ Node status unavailable, giving PQ 30s to compress...")
+            time.sleep(min(timeout, 30))
+            return
+        shards = [
+            shard
+            for node in nodes
+            for shard in node.get("shards") or []
+            if shard.get("class") == class_name
+        ]
+        if shards and all(shard.get("compressed") for shard in shards):
+            return
+        time.sleep(2)
+    print(f"⚠️ {class_name} did not report compressed vectors within {timeout}s")
+
+
+def run_vector_queries(client, class_name, query_vectors, k):
+    """near_vector search for each query: (ids per query, latencies in ms)."""
+    results, latencies = [], []
+    for vector in query_vectors:
+        started = time.perf_counter()
+        response = (
+            client.query.get(class_name, ["article"])
+            .with_near_vector({"vector": vector.tolist()})
+            .with_limit(k)
+            .with_additional(["id"])
+            .do()
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits = response.get("data", {}).get("Get", {}).get(class_name) or []
+        results.append([hit["_additional"]["id"] for hit in hits])
+    return results, latencies
+
+
+def drop_class(client, class_name):
+    if client.schema.exists(class_name):
+        client.schema.delete_class(class_name)
+
+
+# ---------- COMPRESSION ---------- #
+def estimate_memory_per_million(
+    compression=None,
+    dims=VECTOR_DIMS,
+    pq_segments=PQ_SEGMENTS,
+    max_connections=DEFAULT_MAX_CONNECTIONS,
+):
+    """Approximate HNSW RAM for 1M objects: in-memory vectors + layer-0 links.
+
+    With compression the full float32 vectors stay on disk for rescoring,
+    so only the compressed codes count towards memory.
+    """
+    vector_bytes = {None: dims * 4, "pq": pq_segments, "bq": dims / 8}[compression]
+    graph_bytes = 2 * max_connections * 8  # up to 2*maxConnections uint64 ids
+    per_million = 1_000_000
+    return {
+        "vector_gb": round(vector_bytes * per_million / 1e9, 3),
+        "graph_gb": round(graph_bytes * per_million / 1e9, 3),
+        "total_gb": round((vector_bytes + graph_bytes) * per_million / 1e9, 3),
+    }
+
+
+def bench_compression(client, args):
+    ids, vectors, properties = fetch_objects(
+        client, args.source_class, limit=args.limit
+    )
+    if not ids:
+        raise SystemExit(f"❌ No objects found in {args.source_class}")
+    print(f"📦 Copied {len(ids)} vectors from {args.source_class}")
+
+    queries = load_queries(args.queries)
+    query_vectors = np.asarray(
+        get_embedder().encode(queries, normalize_embeddings=True), dtype=np.float32
+    )
+    truth = brute_force_topk(vectors, query_vectors, args.k)
+    truth_ids = [[ids[i] for i in row] for row in truth]
+
+    report = {"objects": len(ids), "queries": len(queries), "k": args.k, "variants": {}}
+    for variant in args.variants:
+        compression = None if variant == "none" else variant
+        class_name = f"{args.source_class}Bench{variant.title()}"
+        print(f"🧪 {variant}: building {class_name} ...")
+        heap_before = heap_inuse_bytes(args.metrics_url)
+
+        config = build_vector_index_config(
+            compression, rescore_limit=args.rescore_limit, pq_segments=args.pq_segments
+        )
+        copy_into_class(client, class_name, ids, vectors, properties, config)
+        if compression == "pq":
+            wait_for_compression(client, class_name)
+
+        found, latencies = run_vector_queries(client, class_name, query_vectors, args.k)
+        recalls = [recall_at_k(f, t) for f, t in zip(found, truth_ids)]
+        heap_after = heap_inuse_bytes(args.metrics_url)
+
+        result = {
+            "recall_at_k": round(statistics.mean(recalls), 4),
+            **latency_summary(latencies),
+            "memory_per_million_chunks": estimate_memory_per_million(
+                compression, pq_segments=args.pq_segments
+            ),
+        }
+        if heap_before is not None and heap_after is not None:
+            result["measured_heap_delta_mb"] = round(
+                (heap_after - heap_before) / 1e6, 1
+            )
+        report["variants"][variant] = result
+        print(f"   {json.dumps(result)}")
+
+        if not args.keep:
+            drop_class(client, class_name)
+    return report
+
+
+# ---------- HNSW SWEEP ---------- #
+def run_retriever_queries(retriever, class_name, queries, k):
+    """Replay queries through WeaviateHybridRetriever.retrieve on a class."""
+    retriever.class_name = class_name
+    # Benchmark copies are never source-partitioned, and fetch_objects leaves
+    # the summaries out of them
+    retriever.partitions = []
+    retriever.summary_class = None
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            docs = retriever.retrieve(query, k=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([doc.metadata.get("_id") for doc in docs])
+    return results, latencies
+
+
+def bench_hnsw(client, args):
+    from core_chatbot import WeaviateHybridRetriever
+
+    ids, vectors, properties = fetch_objects(
+        client, args.source_class, limit=args.limit
+    )
+    if not ids:
+        raise SystemExit(f"❌ No objects found in {args.source_class}")
+    print(f"📦 Copied {len(ids)} vectors from {args.source_class}")
+
+    queries = load_queries(args.queries)
+    retriever = WeaviateHybridRetriever(class_name=args.source_class)
+    query_vectors = np.asarray(
+        retriever.embedder.encode(queries, normalize_embeddings=True),
+        dtype=np.float32,
+    )
+    truth = brute_force_topk(vectors, query_vectors, args.k)
+    vector_truth = [[ids[i] for i in row] for row in truth]
+
+    # A flat (exact) copy gives ground truth for the full hybrid retrieve path
+    flat_class = f"{args.source_class}BenchFlat"
+    print(f"🧪 flat: building exact baseline {flat_class} ...")
+    copy_into_class(client, flat_class, ids, vectors, properties, None, "flat")
+    retrieve_truth, _ = run_retriever_queries(retriever, flat_class, queries, args.k)
+
+    report = {
+        "objects": len(ids),
+        "queries": len(queries),
+        "k": args.k,
+        "settings": [],
+    }
+    for ef_construction in args.ef_construction:
+        for max_connections in args.max_connections:
+            class_name = f"{args.source_class}BenchC{ef_construction}M{max_connections}"
+            print(
+                f"🧪 efConstruction={ef_construction} maxConnections={max_connections}"
+            )
+            config = build_vector_index_config(
+                ef_construction=ef_construction, max_connections=max_connections
+            )
+            started = time.perf_counter()
+            copy_into_class(client, class_name, ids, vectors, properties, config)
+            build_seconds = time.perf_counter() - started
+
+            # ef is a query-time setting, so one build covers every ef value
+            for ef in args.ef:
+                client.schema.update_config(
+                    class_name, {"vectorIndexConfig": {"ef": ef}}
+                )
+                found, vector_latencies = run_vector_queries(
+                    client, class_name, query_vectors, args.k
+                )
+                hits, retrieve_latencies = run_retriever_queries(
+                    retriever, class_name, queries, args.k
+                )
+                result = {
+                    "ef": ef,
+                    "efConstruction": ef_construction,
+                    "maxConnections": max_connections,
+                    "build_seconds": round(build_seconds, 1),
+                    "vector_recall_at_k": round(
+                        statistics.mean(
+                            recall_at_k(f, t) for f, t in zip(found, vector_truth)
+                        ),
+                        4,
+                    ),
+                    "retrieve_recall_at_k": round(
+                        statistics.mean(
+                            recall_at_k(h, t) for h, t in zip(hits, retrieve_truth)
+                        ),
+                        4,
+                    ),
+                    "vector": latency_summary(vector_latencies),
+                    "retrieve": latency_summary(retrieve_latencies),
+                }
+                report["settings"].append(result)
+                print(f"   {json.dumps(result)}")
+
+            if not args.keep:
+                drop_class(client, class_name)
+
+    if not args.keep:
+        drop_class(client, flat_class)
+    return report
+
+
+# ---------- INVERTED INDEX ---------- #
+def bench_filters(client, args):
+    """Filtered hybrid latency with default vs tuned inverted-index settings."""
+    from core_chatbot import WeaviateHybridRetriever
+
+    ids, vectors, properties = fetch_objects(
+        client, args.source_class, limit=args.limit
+    )
+    if not ids:
+        raise SystemExit(f"❌ No objects found in {args.source_class}")
+    print(f"📦 Copied {len(ids)} objects from {args.source_class}")
+
+    retriever = WeaviateHybridRetriever(class_name=args.source_class)
+    queries = [
+        q
+        for q in load_queries(args.queries)
+        if any(retriever.extract_process_and_parameters(q))
+    ]
+    print(f"🔎 {len(queries)} queries produce metadata filters")
+
+    report = {"objects": len(ids), "queries": len(queries), "k": args.k, "variants": {}}
+    for variant, tuned in (("default", False), ("tuned", True)):
+        class_name = f"{args.source_class}Bench{variant.title()}Index"
+        print(f"🧪 {variant}: building {class_name} ...")
+        copy_into_class(
+            client,
+            class_name,
+            ids,
+            vectors,
+            properties,
+            None,
+            tuned_inverted_index=tuned,
+        )
+        run_retriever_queries(retriever, class_name, queries, args.k)  # warm-up
+        latencies, result_counts = [], []
+        for _ in range(args.repeats):
+            hits, run_latencies = run_retriever_queries(
+                retriever, class_name, queries, args.k
+            )
+            latencies.extend(run_latencies)
+            result_counts.extend(len(h) for h in hits)
+        result = {
+            **latency_summary(latencies),
+            "mean_results": round(statistics.mean(result_counts), 1),
+        }
+        report["variants"][variant] = result
+        print(f"   {json.dumps(result)}")
+        if not args.keep:
+            drop_class(client, class_name)
+
+    before = report["variants"]["default"]["p50_ms"]
+    after = report["variants"]["tuned"]["p50_ms"]
+    report["p50_speedup"] = round(before / after, 2) if after else None
+    return report
+
+
+# ---------- CLI ---------- #
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Weaviate index benchmarks")
+    parser.add_argument("--weaviate-url", default=WEAVIATE_URL)
+    parser.add_argument("--source-class", default=CLASS_NAME)
+    parser.add_argument("--queries", help="JSON list or text file, one query per line")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--limit", type=int, help="copy at most this many objects")
+    parser.add_argument("--keep", action="store_true", help="keep benchmark classes")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    compression = sub.add_parser(
+        "compression", help="memory / recall / latency of PQ and BQ vs uncompressed"
+    )
+    compression.add_argument(
+        "--variants",
+        nargs="+",
+        default=["none", "pq", "bq"],
+        choices=["none", "pq", "bq"],
+    )
+    compression.add_argument("--rescore-limit", type=int, default=RESCORE_LIMIT)
+    compression.add_argument("--pq-segments", type=int, default=PQ_SEGMENTS)
+    compression.add_argument(
+        "--metrics-url",
+        help="Weaviate Prometheus endpoint (e.g. http://localhost:2112/metrics) "
+        "to also report measured heap growth",
+    )
+
+    hnsw = sub.add_parser(
+        "hnsw", help="recall@k and p50/p95 latency across HNSW settings"
+    )
+    hnsw.add_argument("--ef", type=int, nargs="+", default=[-1, 64, 128, 256])
+    hnsw.add_argument("--ef-construction", type=int, nargs="+", default=[64, 128, 256])
+    hnsw.add_argument("--max-connections", type=int, nargs="+", default=[16, 32, 64])
+
+    filters = sub.add_parser(
+        "filters", help="filtered hybrid latency, default vs tuned inverted index"
+    )
+    filters.add_argument("--repeats", type=int, default=5)
+
+    args = parser.parse_args(argv)
+    client = WeaviateClient(args.weaviate_url)
+
+    commands = {
+        "compression": bench_compression,
+        "hnsw": bench_hnsw,
+        "filters": bench_filters,
+    }
+    report = commands[args.command](client, args)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
 import os
-import json
-import re
 from dotenv import load_dotenv
 from langchain_openai import AzureChatOpenAI  # or OpenAI
 from langchain.schema import Document
 from weaviate import Client as WeaviateClient
 from langchain_text_splitters import TokenTextSplitter
-from sentence_transformers import SentenceTransformer
+from embedding_backends import get_embedder
+from hybrid_retriever import HybridRetrieverBase
+from retrieval_utils import hit_metadata
 
 # --- Load ENV for Azure (or modify for OpenAI) --- #
 load_dotenv()
@@ -52,11 +52,17 @@ class PromptManager:
 
 
 # --- Hybrid Retriever using Weaviate --- #
-class WeaviateHybridRetriever:
-    def __init__(self):
+class WeaviateHybridRetriever(HybridRetrieverBase):
+    def __init__(self, class_name=CLASS_NAME):
         self.client = WeaviateClient(WEAVIATE_URL)
+        self.class_name = class_name
         self.analyzer = QueryAnalyzer()
-        self.embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+        # torch, quantized ONNX or the t2v service, picked by EMBEDDING_BACKEND
+        self.embedder = get_embedder(
+            model_name="sentence-transformers/all-MiniLM-L6-v2"
+        )
+        self._init_query_state()
+        self._init_index_classes()
 
         # Define known process names and their parameter list
         self.process_names = [
@@ -2450,127 +2456,19 @@ class WeaviateHybridRetriever:
             "near to",
             "more than",
         ]
+        self._init_entity_matcher()
 
-    def extract_process_and_parameters(self, query: str):
-        query_lower = query.lower()
-        matched_processes = []
-        matched_parameters = []
-
-        # Match process names
-        for process in self.process_names:
-            if process in query_lower:
-                matched_processes.append(process)
-
-        # Match parameters
-        for param_list in self.process_parameters.values():
-            for param in param_list:
-                if param.lower() in query_lower:
-                    matched_parameters.append(param)
-
-        # STEP 1: Capture all 4–6 digit numbers
-        all_numbers = re.findall(r"\b\d{4,6}\b", query_lower)
-
-        articles = []
-        for number in all_numbers:
-            # Check if it's preceded by a keyword like "around", "near to", etc.
-            keyword_pattern = rf"(around|close to|less than|greater than|near to|more than)\s+{number}"
-            is_keyworded = re.search(keyword_pattern, query_lower)
+    def retrieve(self, query, k=30, content_limit=None):
+        """Top-k Documents; only the first `content_limit` get their content.
 
-            # Explicit "article 8090" capture
-            explicit_pattern = rf"article\s+{number}"
-            is_explicit = re.search(explicit_pattern, query_lower)
-
-            if is_explicit:
-                articles.append(number)
-            elif not is_keyworded:
-                articles.append(number)
-
-        return matched_processes, matched_parameters, list(set(articles))
-
-    def retrieve(self, query, k=30):
-        print(f"📡 Sending hybrid query to Weaviate: '{query}'")
-        query_vector = self.embedder.encode(query, normalize_embeddings=True).tolist()
-
-        # Extract filters
-        processes, parameters, articles = self.extract_process_and_parameters(query)
-        print(f"🔍 Matched Processes: {processes}")
-        print(f"🔍 Matched Parameters: {parameters}")
-        print(f"🔍 Matched Articles: {articles}")
-
-        article_filters = [
-            {"path": ["article"], "operator": "Equal", "valueText": art}
-            for art in articles
-        ]
-        param_filters = [
-            {
-                "path": ["parameter_names"],
-                "operator": "ContainsAny",
-                "valueText": [param.lower()],
-            }
-            for param in parameters
-        ]
-        stage_filters = [
-            {"path": ["stage"], "operator": "Equal", "valueText": stage.lower()}
-            for stage in processes
+        Documents past `content_limit` have empty page_content.
+        """
+        results = [
+            Document(page_content=hit.get("content", ""), metadata=hit_metadata(hit))
+            for hit in self.retrieve_hits(query, k, content_limit)
         ]
-
-        compound_filters = []
-        if article_filters:
-            compound_filters.append({"operator": "Or", "operands": article_filters})
-        if param_filters:
-            compound_filters.append({"operator": "Or", "operands": param_filters})
-        if stage_filters:
-            compound_filters.append({"operator": "Or", "operands": stage_filters})
-
-        where_filter = (
-            {"operator": "And", "operands": compound_filters}
-            if compound_filters
-            else None
-        )
-
-        if where_filter:
-            print(f"🔍 Filters Applied: {json.dumps(where_filter, indent=2)}")
-
-        # Query with filters
-        query_obj = self.client.query.get(CLASS_NAME, ["content", "metadata"])
-        if where_filter:
-            query_obj = query_obj.with_where(where_filter)
-
-        response = (
-            query_obj.with_hybrid(query=query, vector=query_vector, alpha=0.5)
-            .with_limit(k)
-            .do()
-        )
-
-        raw_hits = response.get("data", {}).get("Get", {}).get(CLASS_NAME)
-
-        # Fallback: No hits with filters
-        if not raw_hits:
-            print("⚠️ No results with metadata filter. Retrying without filter...")
-            response = (
-                self.client.query.get(CLASS_NAME, ["content", "metadata"])
-                .with_hybrid(query=query, vector=query_vector, alpha=0.5)
-                .with_limit(k)
-                .do()
-            )
-            raw_hits = response.get("data", {}).get("Get", {}).get(CLASS_NAME)
-
-        if not raw_hits:
-            print("⚠️ Still no results after fallback.")
-            return []
-
-        results = []
-        for hit in raw_hits:
-            content = hit.get("content", "")
-            meta = hit.get("metadata", {})
-            if isinstance(meta, str):
-                try:
-                    meta = json.loads(meta)
-                except:
-                    meta = {"raw": meta}
-            results.append(Document(page_content=content, metadata=meta))
-
-        print(f"✅ Retrieved {len(results)} documents.")
+        if results:
+            print(f"✅ Retrieved {len(results)} documents.")
         return results
 
 
@@ -2594,9 +2492,15 @@ class TextileChatbot:
         query_type = self.analyzer.analyze(query)
         print(f"🔎 Type: {query_type}")
 
+        # Paraphrases of an answered question skip retrieval and the LLM
+        cached = self.retriever.cached_answer(query, query_type)
+        if cached:
+            print("⚡ Answer served from the semantic cache")
+            return cached[0]
+
         token_splitter = TokenTextSplitter(chunk_size=1500, chunk_overlap=0)
 
-        docs = self.retriever.retrieve(query, k=30)
+        docs = self.retriever.retrieve(query, k=30, content_limit=20)
         if not docs:
             return "⚠️ No relevant documents found."
 
@@ -2620,7 +2524,9 @@ class TextileChatbot:
         prompt = self.prompter.get_prompt(query_type, context, query)
 
         response = self.llm.invoke(prompt)
-        return response.content if hasattr(response, "content") else str(response)
+        answer = response.content if hasattr(response, "content") else str(response)
+        self.retriever.remember_answer(query, query_type, answer)
+        return answer
 
 
 # --- Main Run Loop --- #
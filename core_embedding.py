@@ -1,9 +1,37 @@
+import argparse
+import hashlib
+import itertools
 import json
-import re
-from sentence_transformers import SentenceTransformer
+import os
+import queue
+import threading
+import time
 from weaviate import Client as WeaviateClient
 from tqdm import tqdm
 import weaviate
+from weaviate.util import generate_uuid5
+from textile_matcher import StageParameterMatcher
+from embedding_backends import get_embedder
+from vector_artifact import ArtifactWriter
+from retrieval_utils import source_class_name, source_partitions
+from index_metadata import write_index_metadata
+from filter_stats import FilterStatsBuilder
+from article_index import (
+    ARTICLE_INDEX_CLASS_NAME,
+    ArticleIndexBuilder,
+    ensure_article_index_class,
+)
+from article_summaries import ArticleSummaryBuilder
+
+try:
+    import ijson  # optional: faster streaming of large JSON arrays
+except ImportError:
+    ijson = None
+
+try:
+    import tiktoken  # optional: exact token counts (installed with langchain-openai)
+except ImportError:
+    tiktoken = None
 
 # ---------- CONFIG ---------- #
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
@@ -12,6 +40,49 @@ WEAVIATE_URL = "http://localhost:8080"
 CLASS_NAME = "TextileChunk"
 BATCH_SIZE = 32
 
+# Pipelined ingestion: encode on the main thread while a worker uploads
+PIPELINED_UPLOAD = True
+PARTITION_BY_SOURCE = False  # one class per metadata.source instead of one class
+ARTICLE_SUMMARIES = True  # one summary document per article (doc_type="summary")
+# Encoding of the apps' TokenTextSplitter, so token_count matches their budget
+TOKEN_ENCODING = "gpt2"
+ENCODE_BATCH_SIZE = 64
+UPLOAD_QUEUE_SIZE = 4  # encoded batches buffered before encoding blocks
+
+# Batch import tuning
+DYNAMIC_BATCHING = True  # let the client adapt batch size to server latency
+IMPORT_WORKERS = 2  # concurrent batch requests in flight
+MAX_IMPORT_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1.0
+FAILED_JOURNAL_FILE = "failed_objects.jsonl"
+
+# Resumable runs
+CHECKPOINT_FILE = "ingest_checkpoint.json"
+CHECKPOINT_EVERY = 512  # chunks committed between checkpoint writes
+
+# Vector compression in the HNSW index: None, "pq" or "bq"
+VECTOR_COMPRESSION = None
+PQ_SEGMENTS = 96  # must divide the 384 dims; 96 -> 4 dims per 1-byte code
+PQ_CENTROIDS = 256
+PQ_TRAINING_LIMIT = 100000
+RESCORE_LIMIT = 200  # BQ candidates rescored with the full vectors
+
+# HNSW graph parameters; None keeps Weaviate's defaults (ef -1 = dynamic,
+# efConstruction 128, maxConnections 32)
+HNSW_EF = None
+HNSW_EF_CONSTRUCTION = None
+HNSW_MAX_CONNECTIONS = None
+
+# Exact-match, filter-only indexes for article/stage/parameter_names etc.;
+# content stays the only BM25-searchable property
+TUNED_INVERTED_INDEX = True
+
+# Keep the full metadata JSON alongside the typed properties (fetched lazily)
+STORE_RAW_METADATA = True
+
+# Chunk files are streamed, never loaded whole
+STREAM_BLOCK_SIZE = 1 << 16
+
 # ---------- STAGE & PARAMETER DICTIONARY ---------- #
 PROCESS_NAMES = [
     "ageing",
@@ -2414,118 +2485,1179 @@ PROCESS_PARAMETERS = {
     ],
 }
 
-# ---------- LOAD CHUNKS ---------- #
-print(f"📦 Loading chunks from: {CHUNK_FILE}")
-with open(CHUNK_FILE, "r", encoding="utf-8") as f:
-    chunks = json.load(f)
+# ---------- HELPER: Detect stage and parameter names ---------- #
+# Compiled once; every chunk is then scanned in a single pass per vocabulary
+STAGE_MATCHER = StageParameterMatcher(PROCESS_NAMES, PROCESS_PARAMETERS)
+
+
+def detect_stage(content, metadata, content_lower=None):
+    stage = metadata.get("stage") or metadata.get("Stage")
+    if stage:
+        return stage.lower()
+    if content_lower is None:
+        content_lower = content.lower()
+    return STAGE_MATCHER.detect_stage(content_lower)
+
+
+def extract_parameters(content, stage, content_lower=None):
+    if content_lower is None:
+        content_lower = content.lower()
+    return STAGE_MATCHER.extract_parameters(content_lower, stage)
+
+
+def _first_value(metadata, keys):
+    for key in keys:
+        value = metadata.get(key)
+        if value not in (None, ""):
+            return str(value).strip()
+    return ""
+
+
+def extract_typed_metadata(chunk, metadata):
+    """Frequently used metadata fields, normalised across Route/BOM/Quality chunks."""
+    flat = metadata.get("flat_metadata", {}) or {}
+    merged = {**flat, **metadata}
+    fibres = []
+    for key in ("warp_fibre", "weft_fibre", "fibre", "warp fibre", "weft fibre"):
+        value = merged.get(key)
+        if value not in (None, "") and str(value).strip() not in fibres:
+            fibres.append(str(value).strip())
+    return {
+        "source": _first_value(merged, ["source"]),
+        "sheet": _first_value(merged, ["sheet", "Sheet"])
+        or str(chunk.get("sheet") or ""),
+        "full_article": _first_value(merged, ["full_article", "full article"]),
+        "machine": _first_value(
+            merged,
+            ["machine used in processing", "machine_used_in_processing", "machine"],
+        ),
+        "fibres": fibres,
+    }
+
+
+def prepare_record(chunk, store_raw_metadata=STORE_RAW_METADATA):
+    """Build the Weaviate data object for a chunk, or None if it has no article."""
+    content = chunk.get("content", "")
+    metadata = chunk.get("metadata", {})
+
+    content_lower = content.lower()
+
+    stage = detect_stage(content, metadata, content_lower)
+    parameter_names = extract_parameters(content, stage, content_lower) if stage else []
+    parameter_names = [p.lower() for p in parameter_names]
+
+    # Robust article extraction (fallback to flat_metadata)
+    article = (
+        metadata.get("article")
+        or metadata.get("flat_metadata", {}).get("article")
+        or ""
+    )
+    article = str(article).strip()
+    if not article:
+        return None
+
+    record = {
+        "content": content,
+        "article": article,
+        "stage": (stage or "").lower(),
+        "parameter_names": parameter_names,
+        "doc_type": "chunk",
+        "token_count": count_tokens(content),
+        **extract_typed_metadata(chunk, metadata),
+    }
+    if store_raw_metadata:
+        record["metadata"] = json.dumps(metadata)
+    return record
+
+
+_token_encoder = None
+
+
+def count_tokens(text):
+    """Tokens in `text` as the apps' TokenTextSplitter counts them."""
+    global _token_encoder
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, len(text) // 4)  # rough estimate
+    if _token_encoder is None:
+        _token_encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+    return len(_token_encoder.encode(text, disallowed_special=()))
+
+
+def chunk_uuid(index, record):
+    """Deterministic object id, so re-importing a chunk overwrites instead of duplicating."""
+    return generate_uuid5(record["content"], f"{record['article']}-{index}")
+
 
-if not isinstance(chunks, list):
-    raise ValueError("❌ Loaded data is not a list of chunks.")
-print(f"✅ Loaded {len(chunks)} chunks")
+# ---------- BATCH IMPORTER ---------- #
+class BatchImporter:
+    """Weaviate batch import that checks per-object results.
 
-# ---------- LOAD EMBEDDING MODEL ---------- #
-print(f"🔍 Loading model: {MODEL_NAME}")
-model = SentenceTransformer(MODEL_NAME)
+    Objects rejected by Weaviate (or never acknowledged because a request
+    failed) are retried with exponential backoff once the main batch is
+    flushed. Whatever still fails is appended to a JSONL journal that
+    `replay_journal` can re-import later.
+    """
+
+    def __init__(
+        self,
+        client,
+        class_name=CLASS_NAME,
+        batch_size=BATCH_SIZE,
+        dynamic=DYNAMIC_BATCHING,
+        num_workers=IMPORT_WORKERS,
+        max_retries=MAX_IMPORT_RETRIES,
+        backoff=RETRY_BACKOFF_SECONDS,
+        journal_file=FAILED_JOURNAL_FILE,
+    ):
+        self.client = client
+        self.class_name = class_name
+        self.batch_size = batch_size
+        self.dynamic = dynamic
+        self.num_workers = num_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.journal_file = journal_file
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._failed = {}
+        self._batch = None
+        self.imported = 0
+        self.retried = 0
+        self.journaled = 0
+        self._started = None
+        self._elapsed = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._batch = self.client.batch.configure(
+            batch_size=self.batch_size,
+            dynamic=self.dynamic,
+            num_workers=self.num_workers,
+            timeout_retries=3,
+            connection_error_retries=3,
+            callback=self._on_results,
+        )
+        self._batch.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        self._batch.__exit__(exc_type, exc, tb)
+        self._batch = None
+        self._elapsed = time.perf_counter() - self._started
+        return False
+
+    def add(self, record, vector, uuid, class_name=None):
+        class_name = class_name or self.class_name
+        if vector is not None:  # None for vector-less helper classes
+            vector = vector.tolist() if hasattr(vector, "tolist") else list(vector)
+        with self._lock:
+            self._pending[uuid] = (record, vector, class_name)
+        self._batch.add_data_object(
+            data_object=record,
+            class_name=class_name,
+            vector=vector,
+            uuid=uuid,
+        )
+
+    def commit(self):
+        """Flush, retry failures and journal the rest.
+
+        After this returns every object added so far is either stored in
+        Weaviate or recorded in the journal.
+        """
+        self._batch.flush()
+        self._retry_failed()
+        self._write_journal()
+
+    def _on_results(self, results):
+        if not results:
+            return
+        with self._lock:
+            for result in results:
+                uuid = result.get("id")
+                item = self._pending.pop(uuid, None)
+                errors = result.get("result", {}).get("errors")
+                if errors:
+                    if item is not None:
+                        self._failed[uuid] = (*item, errors)
+                elif item is not None:
+                    self.imported += 1
+
+    def _collect_unacknowledged(self):
+        # Objects whose whole request failed never show up in a callback
+        with self._lock:
+            for uuid, (record, vector, class_name) in self._pending.items():
+                self._failed[uuid] = (
+                    record,
+                    vector,
+                    class_name,
+                    {"error": "not acknowledged"},
+                )
+            self._pending.clear()
+
+    def _retry_failed(self):
+        self._collect_unacknowledged()
+        for attempt in range(1, self.max_retries + 1):
+            if not self._failed:
+                return
+            delay = self.backoff * 2 ** (attempt - 1)
+            print(
+                f"🔁 Retrying {len(self._failed)} failed objects in {delay:.1f}s "
+                f"(attempt {attempt}/{self.max_retries})..."
+            )
+            time.sleep(delay)
+
+            with self._lock:
+                retry, self._failed = self._failed, {}
+            self.retried += len(retry)
+            for uuid, (record, vector, class_name, _) in retry.items():
+                self.add(record, vector, uuid, class_name)
+            self._batch.flush()
+            self._collect_unacknowledged()
+
+    def _write_journal(self):
+        with self._lock:
+            failed, self._failed = self._failed, {}
+        if not failed:
+            return
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            for uuid, (record, vector, class_name, errors) in failed.items():
+                entry = {
+                    "uuid": uuid,
+                    "class_name": class_name,
+                    "data_object": record,
+                    "vector": vector,
+                    "errors": errors,
+                }
+                f.write(json.dumps(entry) + "\n")
+        self.journaled += len(failed)
+        print(f"📝 {len(failed)} objects still failing, written to {self.journal_file}")
+
+    def report(self):
+        rate = self.imported / self._elapsed if self._elapsed else 0.0
+        return (
+            f"Imported {self.imported} objects in {self._elapsed:.1f}s "
+            f"({rate:.1f} obj/s) | Retried: {self.retried} | Journaled: {self.journaled}"
+        )
+
+
+def replay_journal(client, journal_file=FAILED_JOURNAL_FILE):
+    """Re-import objects recorded by a previous run's BatchImporter.
+
+    The journal is moved to `<journal>.replaying` while its objects are
+    re-imported and deleted only once every class has been committed, so
+    an interrupted replay keeps them and the next replay picks them up.
+    """
+    replay_file = f"{journal_file}.replaying"
+    if os.path.exists(journal_file):
+        # The importer appends anything that fails again to a fresh journal
+        if os.path.exists(replay_file):
+            # Left by an interrupted replay: replay its objects with these
+            with open(journal_file, "r", encoding="utf-8") as src:
+                with open(replay_file, "a", encoding="utf-8") as dst:
+                    dst.write(src.read())
+            os.remove(journal_file)
+        else:
+            os.replace(journal_file, replay_file)
+    if not os.path.exists(replay_file):
+        print(f"✅ No journal found at {journal_file}, nothing to replay.")
+        return None
+
+    with open(replay_file, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    print(f"🔁 Replaying {len(entries)} objects from {journal_file}...")
+
+    by_class = {}
+    for entry in entries:
+        by_class.setdefault(entry["class_name"], []).append(entry)
+
+    importer = None
+    for class_name, class_entries in by_class.items():
+        importer = BatchImporter(
+            client, class_name=class_name, journal_file=journal_file
+        )
+        with importer:
+            for entry in class_entries:
+                importer.add(entry["data_object"], entry["vector"], entry["uuid"])
+        print(f"✅ {class_name}: {importer.report()}")
+    os.remove(replay_file)
+    return importer
+
+
+# ---------- CHECKPOINTING ---------- #
+def file_fingerprint(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def load_checkpoint(checkpoint_file, fingerprint, class_name):
+    """Return the saved checkpoint if it belongs to this chunk file and class."""
+    if not os.path.exists(checkpoint_file):
+        return None
+    with open(checkpoint_file, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if (
+        checkpoint.get("fingerprint") != fingerprint
+        or checkpoint.get("class_name") != class_name
+    ):
+        print("⚠️ Checkpoint is for a different chunk file or class, ignoring it.")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_file, checkpoint):
+    tmp_file = f"{checkpoint_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_file, checkpoint_file)
+
+
+# ---------- PIPELINED ENCODE + UPLOAD ---------- #
+_PIPELINE_DONE = object()
+
+
+def _put_or_abort(work_queue, item, worker, stats):
+    """Block on the bounded queue, but give up if the consumer has died.
+
+    Raises the uploader's own exception, so the caller sees why it stopped.
+    """
+    while True:
+        try:
+            work_queue.put(item, timeout=1)
+            return
+        except queue.Full:
+            if not worker.is_alive():
+                if stats["error"] is not None:
+                    raise stats["error"]
+                raise RuntimeError("Upload worker stopped unexpectedly")
+
+
+def encode_stage(indexed_chunks, model, work_queue, worker, stats, options):
+    """Producer: prepare records and encode them in batches.
+
+    Each queued item carries the index of the next unread chunk, so the
+    consumer can checkpoint exactly what it has committed.
+    """
+    encode_batch_size = options["encode_batch_size"]
+    pending = []
+    uuids = []
+
+    def flush(next_index):
+        vectors = (
+            model.encode(
+                [record["content"] for record in pending],
+                batch_size=encode_batch_size,
+                normalize_embeddings=True,
+            )
+            if pending
+            else []
+        )
+        item = (
+            list(pending),
+            vectors,
+            list(uuids),
+            next_index,
+            stats["missing_articles"],
+        )
+        _put_or_abort(work_queue, item, worker, stats)
+        pending.clear()
+        uuids.clear()
+
+    next_index = None
+    try:
+        for index, chunk in tqdm(indexed_chunks, desc="🧠 Encoding"):
+            next_index = index + 1
+            record = prepare_record(chunk, options["store_raw_metadata"])
+            if record is None:
+                stats["missing_articles"] += 1
+                print(
+                    f"⚠️ Missing article in chunk: {chunk.get('content', '')[:100]}..."
+                )
+                continue
+            pending.append(record)
+            uuids.append(chunk_uuid(index, record))
+            if len(pending) >= encode_batch_size:
+                flush(next_index)
+
+        if next_index is not None:
+            flush(next_index)
+    finally:
+        # Also on errors/Ctrl-C, so the uploader commits what is already queued
+        if worker.is_alive():
+            _put_or_abort(work_queue, _PIPELINE_DONE, worker, stats)
+
+
+def upload_stage(importer, work_queue, stats, on_commit, options):
+    """Consumer: push encoded batches to Weaviate while the next batch encodes."""
+    checkpoint_every = options["checkpoint_every"]
+    artifact = options.get("artifact")
+    class_for = options.get("class_for")
+    summaries = options.get("summaries")
+    articles = options["articles"]
+    filter_stats = options["filter_stats"]
+    article_index = options["article_index"]
+    try:
+        uncommitted = 0
+        last_position = None
+        with importer:
+            while True:
+                item = work_queue.get()
+                if item is _PIPELINE_DONE:
+                    break
+                records, vectors, uuids, next_index, missing = item
+                for record, vector, uuid in zip(records, vectors, uuids):
+                    target = class_for and class_for(record)
+                    importer.add(record, vector, uuid, target)
+                    if artifact is not None:
+                        artifact.add(uuid, record, vector)
+                    if summaries is not None:
+                        summaries.add(record)
+                    articles.add(record["article"])
+                    filter_stats.add(record)
+                    article_index.add(record, uuid, target)
+                uncommitted += len(records)
+                last_position = (next_index, missing)
+                if uncommitted >= checkpoint_every:
+                    importer.commit()
+                    on_commit(*last_position)
+                    uncommitted = 0
+            importer.commit()
+        if last_position is not None:
+            on_commit(*last_position)
+    except Exception as e:
+        stats["error"] = e
+
+
+def run_pipelined_upload(indexed_chunks, model, importer, on_commit, options):
+    stats = {"missing_articles": options["missing_articles"], "error": None}
+    work_queue = queue.Queue(maxsize=options["queue_size"])
+    worker = threading.Thread(
+        target=upload_stage,
+        args=(importer, work_queue, stats, on_commit, options),
+        daemon=True,
+    )
+    worker.start()
+    try:
+        encode_stage(indexed_chunks, model, work_queue, worker, stats, options)
+    finally:
+        worker.join()
+    if stats["error"] is not None:
+        raise stats["error"]
+    return stats
+
+
+def run_sequential_upload(indexed_chunks, model, importer, on_commit, options):
+    stats = {"missing_articles": options["missing_articles"], "error": None}
+    uncommitted = 0
+    next_index = None
+    with importer:
+        for index, chunk in tqdm(indexed_chunks, desc="✅ Uploading"):
+            next_index = index + 1
+            record = prepare_record(chunk, options["store_raw_metadata"])
+            if record is None:
+                stats["missing_articles"] += 1
+                print(
+                    f"⚠️ Missing article in chunk: {chunk.get('content', '')[:100]}..."
+                )
+                continue  # Skip if article is completely missing
+
+            vector = model.encode(record["content"], normalize_embeddings=True)
+            uuid = chunk_uuid(index, record)
+            class_for = options.get("class_for")
+            target = class_for and class_for(record)
+            importer.add(record, vector, uuid, target)
+            if options.get("artifact") is not None:
+                options["artifact"].add(uuid, record, vector)
+            if options.get("summaries") is not None:
+                options["summaries"].add(record)
+            options["articles"].add(record["article"])
+            options["filter_stats"].add(record)
+            options["article_index"].add(record, uuid, target)
+            uncommitted += 1
+            if uncommitted >= options["checkpoint_every"]:
+                importer.commit()
+                on_commit(next_index, stats["missing_articles"])
+                uncommitted = 0
+        importer.commit()
+    if next_index is not None:
+        on_commit(next_index, stats["missing_articles"])
+    return stats
+
+
+def import_article_summaries(builder, model, importer, options):
+    """Encode and import the per-article summaries collected during upload."""
+    items = list(builder.records())
+    if not items:
+        return 0
+    print(f"📝 Writing {len(items)} article summaries...")
+    encode_batch_size = options["encode_batch_size"]
+    class_for = options.get("class_for")
+    artifact = options.get("artifact")
+    with importer:
+        for start in range(0, len(items), encode_batch_size):
+            batch = items[start : start + encode_batch_size]
+            vectors = model.encode(
+                [record["content"] for _, record in batch],
+                batch_size=encode_batch_size,
+                normalize_embeddings=True,
+            )
+            for (uuid, record), vector in zip(batch, vectors):
+                record["token_count"] = count_tokens(record["content"])
+                importer.add(record, vector, uuid, class_for and class_for(record))
+                if artifact is not None:
+                    artifact.add(uuid, record, vector)
+    return len(items)
+
+
+def import_article_index(client, builder, batch_size, import_workers, journal_file):
+    """Write the article -> chunk-id objects (no vectors) after the chunks."""
+    ensure_article_index_class(client)
+    importer = BatchImporter(
+        client,
+        class_name=ARTICLE_INDEX_CLASS_NAME,
+        batch_size=batch_size,
+        num_workers=import_workers,
+        journal_file=journal_file,
+    )
+    count = 0
+    with importer:
+        for uuid, record in builder.records():
+            importer.add(record, None, uuid)
+            count += 1
+    print(f"📇 Indexed chunk ids of {count} articles")
+    return count
 
-# ---------- INIT WEAVIATE CLIENT ---------- #
-client = WeaviateClient(WEAVIATE_URL)
 
 # ---------- SCHEMA SETUP ---------- #
-if client.schema.exists(CLASS_NAME):
-    print(f"❌ Deleting old class {CLASS_NAME}...")
-    client.schema.delete_class(CLASS_NAME)
-
-print(f"📁 Creating class {CLASS_NAME} in Weaviate...")
-client.schema.create_class(
-    {
-        "class": CLASS_NAME,
+def build_vector_index_config(
+    compression=VECTOR_COMPRESSION,
+    rescore_limit=RESCORE_LIMIT,
+    pq_segments=PQ_SEGMENTS,
+    pq_centroids=PQ_CENTROIDS,
+    pq_training_limit=PQ_TRAINING_LIMIT,
+    ef=HNSW_EF,
+    ef_construction=HNSW_EF_CONSTRUCTION,
+    max_connections=HNSW_MAX_CONNECTIONS,
+):
+    """HNSW `vectorIndexConfig` for the chunk class, or None for the defaults.
+
+    `ef` is the query-time candidate list size (-1 lets Weaviate pick it
+    dynamically); `ef_construction` and `max_connections` shape the graph
+    at build time. See `bench_index.py hnsw` for choosing them.
+
+    "pq" keeps one byte per segment instead of 4 bytes per dimension (16x
+    smaller with 96 segments); "bq" keeps one bit per dimension (32x
+    smaller) and rescores the top `rescore_limit` candidates with the
+    uncompressed vectors.
+    """
+    config = {}
+    if ef is not None:
+        config["ef"] = ef
+    if ef_construction is not None:
+        config["efConstruction"] = ef_construction
+    if max_connections is not None:
+        config["maxConnections"] = max_connections
+
+    if compression == "pq":
+        config["pq"] = {
+            "enabled": True,
+            "segments": pq_segments,
+            "centroids": pq_centroids,
+            "trainingLimit": pq_training_limit,
+            "encoder": {"type": "kmeans", "distribution": "log-normal"},
+        }
+    elif compression == "bq":
+        config["bq"] = {"enabled": True, "rescoreLimit": rescore_limit, "cache": True}
+    elif compression:
+        raise ValueError(f"Unknown vector compression '{compression}'")
+    return config or None
+
+
+def _property(name, data_type, role, tuned=True):
+    """Schema property with inverted-index settings for its role.
+
+    "search": BM25-searchable full text (only `content`)
+    "filter": exact-match values used in `where` filters; `field`
+              tokenization keeps "dry print" a single token, and no
+              BM25 index is built
+    "stored": returned with results but never searched or filtered
+    """
+    prop = {"name": name, "dataType": [data_type]}
+    if not tuned:
+        return prop
+    if role == "search":
+        prop.update(tokenization="word", indexSearchable=True, indexFilterable=False)
+    elif role == "filter":
+        prop.update(tokenization="field", indexSearchable=False, indexFilterable=True)
+    else:
+        prop.update(indexFilterable=False)
+        if data_type.startswith("text"):  # only text has a searchable index
+            prop.update(indexSearchable=False)
+    return prop
+
+
+def chunk_properties(tuned_inverted_index=TUNED_INVERTED_INDEX):
+    tuned = tuned_inverted_index
+    return [
+        _property("content", "text", "search", tuned),
+        _property("metadata", "text", "stored", tuned),
+        _property("article", "text", "filter", tuned),
+        _property("stage", "text", "filter", tuned),
+        _property("parameter_names", "text[]", "filter", tuned),
+        _property("doc_type", "text", "filter", tuned),
+        _property("token_count", "int", "stored", tuned),
+        _property("source", "text", "filter", tuned),
+        _property("sheet", "text", "filter", tuned),
+        _property("full_article", "text", "filter", tuned),
+        _property("machine", "text", "filter", tuned),
+        _property("fibres", "text[]", "filter", tuned),
+    ]
+
+
+def create_schema(
+    client,
+    class_name=CLASS_NAME,
+    vector_index_config=None,
+    vector_index_type="hnsw",
+    tuned_inverted_index=TUNED_INVERTED_INDEX,
+):
+    """Drop and recreate the chunk class.
+
+    PQ needs vectors to train its codebook, so it is left out here and
+    switched on by `enable_deferred_pq` once the import has finished.
+    """
+    if client.schema.exists(class_name):
+        print(f"❌ Deleting old class {class_name}...")
+        client.schema.delete_class(class_name)
+
+    class_schema = {
+        "class": class_name,
         "vectorizer": "none",
-        "properties": [
-            {"name": "content", "dataType": ["text"]},
-            {"name": "metadata", "dataType": ["text"]},
-            {"name": "article", "dataType": ["text"]},
-            {"name": "stage", "dataType": ["text"]},
-            {"name": "parameter_names", "dataType": ["text[]"]},
-        ],
+        "properties": chunk_properties(tuned_inverted_index),
     }
-)
+    index_config = {
+        key: value for key, value in (vector_index_config or {}).items() if key != "pq"
+    }
+    if vector_index_type != "hnsw":
+        # "flat" = exact brute-force search, used as ground truth by bench_index
+        class_schema["vectorIndexType"] = vector_index_type
+    if index_config:
+        class_schema["vectorIndexConfig"] = index_config
 
+    print(f"📁 Creating class {class_name} in Weaviate...")
+    client.schema.create_class(class_schema)
 
-# ---------- HELPER: Detect stage and parameter names ---------- #
-def detect_stage(content, metadata):
-    stage = metadata.get("stage") or metadata.get("Stage")
-    if stage:
-        return stage.lower()
-    for process in PROCESS_NAMES:
-        if process in content.lower():
-            return process
-    return None
 
+def enable_deferred_pq(client, class_name, vector_index_config):
+    """Turn on PQ after import so Weaviate trains it on the stored vectors."""
+    pq_config = (vector_index_config or {}).get("pq")
+    if not pq_config:
+        return
+    print(f"🗜️ Enabling product quantization on {class_name}...")
+    client.schema.update_config(class_name, {"vectorIndexConfig": {"pq": pq_config}})
+
+
+class SourcePartitioner:
+    """Routes records to one class per `source` (TextileChunk_Route, _BOM, ...).
+
+    A class is created the first time its source shows up while streaming,
+    so the set of sources doesn't have to be known up front. Retrieval
+    queries the partitions concurrently and fuses them (see retrieval_utils).
+    """
+
+    def __init__(
+        self,
+        client,
+        class_name=CLASS_NAME,
+        vector_index_config=None,
+        tuned_inverted_index=TUNED_INVERTED_INDEX,
+    ):
+        self.client = client
+        self.class_name = class_name
+        self.vector_index_config = vector_index_config
+        self.tuned_inverted_index = tuned_inverted_index
+        # Existing partitions are kept, so a resumed run appends to them
+        self.classes = set(source_partitions(client, class_name))
 
-def extract_parameters(content, stage):
-    matched_params = []
-    possible_params = PROCESS_PARAMETERS.get(stage, [])
-    for param in possible_params:
-        if re.search(rf"\b{re.escape(param)}\b", content.lower()):
-            matched_params.append(param)
-    return matched_params
+    def reset(self):
+        """Drop the base class and every partition before a fresh import."""
+        for name in sorted(self.classes | {self.class_name}):
+            if self.client.schema.exists(name):
+                print(f"❌ Deleting old class {name}...")
+                self.client.schema.delete_class(name)
+        self.classes.clear()
 
+    def class_for(self, record):
+        name = source_class_name(self.class_name, record.get("source"))
+        if name not in self.classes:
+            create_schema(
+                self.client,
+                name,
+                self.vector_index_config,
+                tuned_inverted_index=self.tuned_inverted_index,
+            )
+            self.classes.add(name)
+        return name
 
-# ---------- EMBEDDING + UPLOAD ---------- #
-print("📤 Uploading chunks with vector embeddings and metadata...")
 
-missing_articles = 0
-uploaded = 0
+# ---------- LOADING ---------- #
+def _iter_json_array(f, block_size=STREAM_BLOCK_SIZE):
+    """Yield the elements of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    started = False
 
-with client.batch(batch_size=BATCH_SIZE) as batch:
-    for chunk in tqdm(chunks, desc="✅ Uploading"):
-        content = chunk.get("content", "")
-        metadata = chunk.get("metadata", {})
+    while True:
+        # Skip whitespace and separators, refilling the buffer as needed
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            block = f.read(block_size)
+            eof = not block
+            buffer, pos = buffer[pos:] + block, 0
 
-        stage = detect_stage(content, metadata)
-        parameter_names = extract_parameters(content, stage) if stage else []
-        parameter_names = [p.lower() for p in parameter_names]
+        if pos >= len(buffer):
+            raise ValueError("❌ Unexpected end of chunk file.")
+        if not started:
+            if buffer[pos] != "[":
+                raise ValueError("❌ Loaded data is not a list of chunks.")
+            started = True
+            pos += 1
+            continue
+        if buffer[pos] == "]":
+            return
 
-        # Robust article extraction (fallback to flat_metadata)
-        article = (
-            metadata.get("article")
-            or metadata.get("flat_metadata", {}).get("article")
-            or ""
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            item, end = None, None
+        # A value touching the end of the buffer may be cut off; read more first
+        if end is None or (end >= len(buffer) and not eof):
+            if eof:
+                raise ValueError(f"❌ Malformed chunk file near offset {pos}.")
+            block = f.read(block_size)
+            eof = not block
+            buffer, pos = buffer[pos:] + block, 0
+            continue
+        yield item
+        pos = end
+        if pos > block_size:
+            buffer, pos = buffer[pos:], 0
+
+
+def iter_chunks(chunk_file=CHUNK_FILE):
+    """Stream chunk records from a JSON array file or a JSONL file.
+
+    Memory stays bounded by one record (plus a read buffer) regardless of
+    corpus size, and encoding can start as soon as the first record is read.
+    """
+    print(f"📦 Streaming chunks from: {chunk_file}")
+    if chunk_file.endswith(".jsonl"):
+        with open(chunk_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif ijson is not None:
+        with open(chunk_file, "rb") as f:
+            yield from ijson.items(f, "item", use_float=True)
+    else:
+        with open(chunk_file, "r", encoding="utf-8") as f:
+            yield from _iter_json_array(f)
+
+
+def load_model(model_name=MODEL_NAME, backend=None):
+    embedder = get_embedder(backend, model_name)
+    print(f"🔍 Loaded model: {model_name} ({embedder.name} backend)")
+    return embedder
+
+
+# ---------- INGESTION API ---------- #
+def ingest(
+    chunk_file=CHUNK_FILE,
+    class_name=CLASS_NAME,
+    batch_size=BATCH_SIZE,
+    encode_batch_size=ENCODE_BATCH_SIZE,
+    import_workers=IMPORT_WORKERS,
+    queue_size=UPLOAD_QUEUE_SIZE,
+    pipelined=PIPELINED_UPLOAD,
+    resume=True,
+    checkpoint_file=CHECKPOINT_FILE,
+    checkpoint_every=CHECKPOINT_EVERY,
+    journal_file=FAILED_JOURNAL_FILE,
+    weaviate_url=WEAVIATE_URL,
+    embedding_backend=None,
+    compression=VECTOR_COMPRESSION,
+    rescore_limit=RESCORE_LIMIT,
+    pq_segments=PQ_SEGMENTS,
+    ef=HNSW_EF,
+    ef_construction=HNSW_EF_CONSTRUCTION,
+    max_connections=HNSW_MAX_CONNECTIONS,
+    store_raw_metadata=STORE_RAW_METADATA,
+    tuned_inverted_index=TUNED_INVERTED_INDEX,
+    export_artifact=None,
+    partition_by_source=PARTITION_BY_SOURCE,
+    article_summaries=ARTICLE_SUMMARIES,
+    client=None,
+    model=None,
+):
+    """Embed the chunk file and import it into Weaviate.
+
+    Progress is checkpointed after every committed batch. With `resume=True`
+    a run that finds a checkpoint for the same chunk file and class keeps
+    the existing class and continues after the last committed chunk;
+    otherwise the class is recreated from scratch.
+
+    With `export_artifact` set, every record and its vector are also written
+    to that directory (see vector_artifact.py) so other deployments can
+    import them without re-embedding. An export always covers the whole
+    chunk file, so it ignores any checkpoint.
+
+    With `partition_by_source` the chunks go to one class per
+    `metadata.source` (e.g. TextileChunk_Route, TextileChunk_BOM) instead
+    of a single `class_name` class.
+
+    With `article_summaries` one summary document per article is imported
+    after the chunks (see article_summaries.py).
+
+    Returns a dict with the import counters.
+    """
+    client = client or WeaviateClient(weaviate_url)
+    fingerprint = file_fingerprint(chunk_file)
+    vector_index_config = build_vector_index_config(
+        compression,
+        rescore_limit=rescore_limit,
+        pq_segments=pq_segments,
+        ef=ef,
+        ef_construction=ef_construction,
+        max_connections=max_connections,
+    )
+
+    if export_artifact and resume:
+        print("📦 Exporting an artifact needs every chunk, ignoring checkpoints")
+        resume = False
+    checkpoint = (
+        load_checkpoint(checkpoint_file, fingerprint, class_name) if resume else None
+    )
+    if checkpoint and checkpoint.get("partition_by_source", False) != bool(
+        partition_by_source
+    ):
+        print("⚠️ Checkpoint used a different partitioning, ignoring it.")
+        checkpoint = None
+    partitioner = (
+        SourcePartitioner(client, class_name, vector_index_config, tuned_inverted_index)
+        if partition_by_source
+        else None
+    )
+    index_exists = (
+        bool(partitioner.classes) if partitioner else client.schema.exists(class_name)
+    )
+    if checkpoint and index_exists:
+        start_index = checkpoint["next_index"]
+        missing_articles = checkpoint["missing_articles"]
+        print(f"⏩ Resuming {class_name} from chunk {start_index}")
+    else:
+        start_index = 0
+        missing_articles = 0
+        if partitioner:
+            partitioner.reset()
+        else:
+            # Partitions of an earlier --partition-by-source run go as well
+            SourcePartitioner(client, class_name).reset()
+            create_schema(
+                client,
+                class_name,
+                vector_index_config,
+                tuned_inverted_index=tuned_inverted_index,
+            )
+
+    def on_commit(next_index, missing):
+        save_checkpoint(
+            checkpoint_file,
+            {
+                "chunk_file": chunk_file,
+                "fingerprint": fingerprint,
+                "class_name": class_name,
+                "partition_by_source": bool(partition_by_source),
+                "next_index": next_index,
+                "missing_articles": missing,
+                "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
         )
-        article = str(article).strip()
-
-        if not article:
-            missing_articles += 1
-            print(f"⚠️ Missing article in chunk: {content[:100]}...")
-            continue  # Skip if article is completely missing
-
-        vector = model.encode(content, normalize_embeddings=True)
-
-        batch.add_data_object(
-            data_object={
-                "content": content,
-                "metadata": json.dumps(metadata),
-                "article": article,
-                "stage": (stage or "").lower(),
-                "parameter_names": parameter_names,
+
+    chunks = iter_chunks(chunk_file)
+    model = model or load_model(MODEL_NAME, embedding_backend)
+
+    importer = BatchImporter(
+        client,
+        class_name=class_name,
+        batch_size=batch_size,
+        num_workers=import_workers,
+        journal_file=journal_file,
+    )
+    options = {
+        "encode_batch_size": encode_batch_size,
+        "queue_size": queue_size,
+        "checkpoint_every": checkpoint_every,
+        "missing_articles": missing_articles,
+        "store_raw_metadata": store_raw_metadata,
+        "artifact": None,
+        "class_for": partitioner.class_for if partitioner else None,
+        "summaries": ArticleSummaryBuilder() if article_summaries else None,
+        # Article numbers the retrievers may turn into filters
+        "articles": set(),
+        # Selectivity counts for the retrievers' filter planner
+        "filter_stats": FilterStatsBuilder(),
+        # Article -> chunk ids for the retrievers' article lookup
+        "article_index": ArticleIndexBuilder(class_name),
+    }
+    if start_index:
+        # Summaries, the article set, filter statistics and article index
+        # need every chunk: replay the ones imported before the resume
+        replayed = itertools.islice(enumerate(iter_chunks(chunk_file)), start_index)
+        for index, chunk in replayed:
+            record = prepare_record(chunk, store_raw_metadata=False)
+            if record is None:
+                continue
+            options["articles"].add(record["article"])
+            options["filter_stats"].add(record)
+            options["article_index"].add(
+                record,
+                chunk_uuid(index, record),
+                options["class_for"] and options["class_for"](record),
+            )
+            if options["summaries"] is not None:
+                options["summaries"].add(record)
+    if export_artifact:
+        options["artifact"] = ArtifactWriter(
+            export_artifact,
+            model_name=MODEL_NAME,
+            settings={
+                "class_name": class_name,
+                "embedding_backend": model.name,
+                "vector_index_config": vector_index_config,
+                "tuned_inverted_index": tuned_inverted_index,
+                "store_raw_metadata": store_raw_metadata,
+                "partition_by_source": bool(partition_by_source),
             },
-            class_name=CLASS_NAME,
-            vector=vector,
         )
-        uploaded += 1
+    indexed_chunks = itertools.islice(enumerate(chunks), start_index, None)
 
-print(
-    f"\n✅ Upload complete. Uploaded: {uploaded} chunks | Skipped: {missing_articles} due to missing article.\n"
-)
+    print("📤 Uploading chunks with vector embeddings and metadata...")
+    run_upload = run_pipelined_upload if pipelined else run_sequential_upload
+    stats = run_upload(indexed_chunks, model, importer, on_commit, options)
+    summary_count = 0
+    if options["summaries"] is not None:
+        summary_count = import_article_summaries(
+            options["summaries"],
+            model,
+            BatchImporter(
+                client,
+                class_name=class_name,
+                batch_size=batch_size,
+                num_workers=import_workers,
+                journal_file=journal_file,
+            ),
+            options,
+        )
+    article_index_count = import_article_index(
+        client, options["article_index"], batch_size, import_workers, journal_file
+    )
+    classes = sorted(partitioner.classes) if partitioner else [class_name]
+    for name in classes:
+        enable_deferred_pq(client, name, vector_index_config)
+    write_index_metadata(
+        client,
+        class_name,
+        chunk_file=chunk_file,
+        chunk_fingerprint=fingerprint,
+        model_name=MODEL_NAME,
+        embedding_backend=model.name,
+        classes=classes,
+        partition_by_source=bool(partition_by_source),
+        article_summaries=summary_count,
+        known_articles=sorted(options["articles"]),
+        filter_stats=options["filter_stats"].to_dict(),
+        article_index=article_index_count,
+    )
+    if options["artifact"] is not None:
+        options["artifact"].close(
+            {"chunk_file": chunk_file, "chunk_fingerprint": fingerprint}
+        )
+
+    # A finished run starts from scratch next time
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+    print(
+        f"\n✅ Upload complete. {importer.report()} | Skipped: {stats['missing_articles']} due to missing article.\n"
+    )
+    return {
+        "imported": importer.imported,
+        "retried": importer.retried,
+        "journaled": importer.journaled,
+        "missing_articles": stats["missing_articles"],
+        "resumed_from": start_index,
+        "classes": classes,
+        "article_summaries": summary_count,
+    }
+
+
+def run_test_query(client, class_name=CLASS_NAME, test_article="8222"):
+    print(f"🔎 Running test query for article = '{test_article}' ...")
+    results = (
+        client.query.get(class_name, ["article", "stage", "source", "full_article"])
+        .with_where(
+            {"path": ["article"], "operator": "Equal", "valueText": test_article}
+        )
+        .with_limit(3)
+        .do()
+    )
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+# ---------- CLI ---------- #
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Embed textile chunks and import them into Weaviate."
+    )
+    parser.add_argument("--chunk-file", default=CHUNK_FILE)
+    parser.add_argument("--class-name", default=CLASS_NAME)
+    parser.add_argument("--weaviate-url", default=WEAVIATE_URL)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    parser.add_argument(
+        "--import-workers",
+        type=int,
+        default=IMPORT_WORKERS,
+        help="concurrent Weaviate batch requests",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=UPLOAD_QUEUE_SIZE,
+        help="encoded batches buffered between the encode and upload stages",
+    )
+    parser.add_argument(
+        "--sequential",
+        action="store_true",
+        help="encode and upload in lockstep instead of pipelining",
+    )
+    parser.add_argument(
+        "--embedding-backend",
+        choices=["torch", "onnx", "t2v"],
+        help="defaults to the EMBEDDING_BACKEND env var, else torch",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=["none", "pq", "bq"],
+        default=VECTOR_COMPRESSION or "none",
+        help="HNSW vector compression (see bench_index.py compression)",
+    )
+    parser.add_argument("--rescore-limit", type=int, default=RESCORE_LIMIT)
+    parser.add_argument("--pq-segments", type=int, default=PQ_SEGMENTS)
+    parser.add_argument("--ef", type=int, default=HNSW_EF, help="HNSW query ef")
+    parser.add_argument("--ef-construction", type=int, default=HNSW_EF_CONSTRUCTION)
+    parser.add_argument("--max-connections", type=int, default=HNSW_MAX_CONNECTIONS)
+    parser.add_argument(
+        "--default-inverted-index",
+        action="store_true",
+        help="use Weaviate's default word tokenization / searchable indexes "
+        "on every property",
+    )
+    parser.add_argument(
+        "--no-raw-metadata",
+        action="store_true",
+        help="store only the typed metadata properties, not the full JSON blob",
+    )
+    parser.add_argument(
+        "--export-artifact",
+        metavar="DIR",
+        help="also write records + vectors to a portable artifact that "
+        "vector_artifact.py can import without re-embedding",
+    )
+    parser.add_argument(
+        "--partition-by-source",
+        action="store_true",
+        default=PARTITION_BY_SOURCE,
+        help="import into one class per metadata.source "
+        "(e.g. TextileChunk_Route, TextileChunk_BOM)",
+    )
+    parser.add_argument(
+        "--no-article-summaries",
+        action="store_true",
+        help="skip the per-article summary documents",
+    )
+    parser.add_argument("--checkpoint-file", default=CHECKPOINT_FILE)
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="ignore any checkpoint and rebuild the class from scratch",
+    )
+    parser.add_argument("--journal-file", default=FAILED_JOURNAL_FILE)
+    parser.add_argument(
+        "--replay-journal",
+        action="store_true",
+        help="only re-import objects recorded in the failed-object journal",
+    )
+    parser.add_argument("--test-article", default="8222")
+    parser.add_argument("--skip-test-query", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    client = WeaviateClient(args.weaviate_url)
+
+    if args.replay_journal:
+        replay_journal(client, args.journal_file)
+        return
+
+    result = ingest(
+        chunk_file=args.chunk_file,
+        class_name=args.class_name,
+        batch_size=args.batch_size,
+        encode_batch_size=args.encode_batch_size,
+        import_workers=args.import_workers,
+        queue_size=args.queue_size,
+        pipelined=not args.sequential,
+        resume=not args.restart,
+        checkpoint_file=args.checkpoint_file,
+        checkpoint_every=args.checkpoint_every,
+        journal_file=args.journal_file,
+        embedding_backend=args.embedding_backend,
+        compression=None if args.compression == "none" else args.compression,
+        rescore_limit=args.rescore_limit,
+        pq_segments=args.pq_segments,
+        ef=args.ef,
+        ef_construction=args.ef_construction,
+        max_connections=args.max_connections,
+        store_raw_metadata=not args.no_raw_metadata,
+        tuned_inverted_index=not args.default_inverted_index,
+        export_artifact=args.export_artifact,
+        partition_by_source=args.partition_by_source,
+        article_summaries=not args.no_article_summaries,
+        client=client,
+    )
+
+    if not args.skip_test_query:
+        for class_name in result["classes"]:
+            run_test_query(client, class_name, args.test_article)
 
-# ---------- QUICK TEST ---------- #
-print("🔎 Running test query for article = '8222' ...")
-test_article = "8222"
-results = (
-    client.query.get(CLASS_NAME, ["article", "stage", "metadata"])
-    .with_where({"path": ["article"], "operator": "Equal", "valueText": test_article})
-    .with_limit(3)
-    .do()
-)
 
-print(json.dumps(results, indent=2))
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@ import streamlit as st
 import json
 import hashlib
 import os
-import re
 from datetime import datetime
 from typing import List, Dict, Any
 import pandas as pd
@@ -10,14 +9,12 @@ import traceback
 
 # Try importing required libraries with error handling
 try:
-    from sentence_transformers import SentenceTransformer
+    from embedding_backends import backend_available, get_embedder
 
-    SENTENCE_TRANSFORMERS_AVAILABLE = True
+    EMBEDDINGS_AVAILABLE = True
 except ImportError:
-    st.error(
-        "❌ sentence-transformers not installed. Run: pip install sentence-transformers"
-    )
-    SENTENCE_TRANSFORMERS_AVAILABLE = False
+    st.error("❌ numpy not installed. Run: pip install numpy")
+    EMBEDDINGS_AVAILABLE = False
 
 try:
     import weaviate
@@ -46,6 +43,8 @@ except ImportError:
     AZURE_OPENAI_AVAILABLE = False
 
 from dotenv import load_dotenv
+from hybrid_retriever import HybridRetrieverBase
+from retrieval_utils import RESULT_PROPERTIES, hit_metadata
 
 # Load environment variables
 load_dotenv()
@@ -56,6 +55,8 @@ CLASS_NAME = "TextileChunk"
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 USERS_FILE = "users.json"
 CHAT_HISTORY_DIR = "chat_histories"
+# Exported vector artifact served in-process when Weaviate is unreachable
+LOCAL_ARTIFACT_DIR = os.getenv("LOCAL_ARTIFACT_DIR", "artifacts/textile")
 
 # Create directories if they don't exist
 os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)
@@ -2223,13 +2224,19 @@ class PromptManager:
 
 
 # Fixed Weaviate Hybrid Retriever
-class WeaviateHybridRetriever:
-    def __init__(self, debug_mode=False):
+class WeaviateHybridRetriever(HybridRetrieverBase):
+    def __init__(self, debug_mode=False, class_name=CLASS_NAME):
         self.debug_mode = debug_mode
+        self.class_name = class_name
         self.use_mock = False
+        self.local_index = None
 
         try:
-            if not WEAVIATE_AVAILABLE or not SENTENCE_TRANSFORMERS_AVAILABLE:
+            if (
+                not WEAVIATE_AVAILABLE
+                or not EMBEDDINGS_AVAILABLE
+                or not backend_available()
+            ):
                 raise Exception("Required libraries not available")
 
             self.client = WeaviateClient(WEAVIATE_URL)
@@ -2238,21 +2245,21 @@ class WeaviateHybridRetriever:
             if not self.client.is_ready():
                 raise Exception("Weaviate server not ready")
 
-            # Check if class exists
-            schema = self.client.schema.get()
-            if not any(cls["class"] == CLASS_NAME for cls in schema.get("classes", [])):
-                raise Exception(f"Class '{CLASS_NAME}' not found")
+            # Check if the class (or its per-source partitions) exists
+            self._init_index_classes()
+            probe_class = (self.partitions or [self.class_name])[0]
+            if not self.client.schema.exists(probe_class):
+                raise Exception(f"Class '{self.class_name}' not found")
 
-            # Initialize embedding model
-            self.embedder = SentenceTransformer(MODEL_NAME)
-            self.process_names = PROCESS_NAMES
-            self.process_parameters = PROCESS_PARAMETERS
+            self._init_query_state()
 
             # Test query to ensure everything works
             test_result = (
-                self.client.query.get(CLASS_NAME, ["content"]).with_limit(1).do()
+                self.client.query.get(probe_class, ["content"]).with_limit(1).do()
+            )
+            raw_results = (
+                test_result.get("data", {}).get("Get", {}).get(probe_class, [])
             )
-            raw_results = test_result.get("data", {}).get("Get", {}).get(CLASS_NAME, [])
 
             if self.debug_mode:
                 st.success(
@@ -2262,10 +2269,58 @@ class WeaviateHybridRetriever:
         except Exception as e:
             if self.debug_mode:
                 st.error(f"❌ Weaviate initialization failed: {str(e)}")
-                st.warning("🔄 Falling back to mock retriever for demo purposes")
 
-            self.use_mock = True
-            self._init_mock_retriever()
+            if not self._init_local_retriever():
+                if self.debug_mode:
+                    st.warning("🔄 Falling back to mock retriever for demo purposes")
+                self.use_mock = True
+                self._init_mock_retriever()
+
+    def _init_query_state(self):
+        """Embedding model, caches and query matchers shared by both backends"""
+        # Initialize embedding model (torch or quantized ONNX)
+        self.embedder = get_embedder(model_name=MODEL_NAME)
+        # Shared by all sessions through initialize_chatbot's cache_resource
+        super()._init_query_state()
+        self.process_names = PROCESS_NAMES
+        self.process_parameters = PROCESS_PARAMETERS
+        self._init_entity_matcher()
+
+    def _init_local_retriever(self):
+        """In-process FAISS + BM25 search over the exported artifact, if present"""
+        if not os.path.exists(os.path.join(LOCAL_ARTIFACT_DIR, "manifest.json")):
+            return False
+        try:
+            if not EMBEDDINGS_AVAILABLE or not backend_available():
+                raise Exception("Embedding backend not available")
+            from local_retriever import LocalHybridIndex
+
+            local_index = LocalHybridIndex(LOCAL_ARTIFACT_DIR)
+            if local_index.model_name != MODEL_NAME:
+                raise Exception(
+                    f"Artifact was embedded with {local_index.model_name}, not {MODEL_NAME}"
+                )
+            self.local_index = local_index
+            self.client = None
+            self.partitions = []
+            self.executor = None
+            self.fallback_executor = None  # local queries take milliseconds
+            self.result_properties = RESULT_PROPERTIES
+            self.hit_properties = RESULT_PROPERTIES  # rows are in memory anyway
+            self.summary_class = self.class_name if local_index.has_summaries else None
+            self._init_query_state()
+        except Exception as e:
+            self.local_index = None
+            if self.debug_mode:
+                st.error(f"❌ Local retriever initialization failed: {str(e)}")
+            return False
+
+        if self.debug_mode:
+            st.success(
+                f"✅ Local retriever initialized from {LOCAL_ARTIFACT_DIR} "
+                f"({local_index.count} records, no Weaviate)"
+            )
+        return True
 
     def _init_mock_retriever(self):
         """Initialize mock retriever for when Weaviate is not available"""
@@ -2296,149 +2351,37 @@ class WeaviateHybridRetriever:
             },
         ]
 
+    def log(self, message):
+        if self.debug_mode:
+            st.write(message)
+
+    def warn(self, message):
+        if self.debug_mode:
+            st.warning(message)
+
     def extract_process_and_parameters(self, query: str):
         """Extract processes, parameters, and articles from query"""
         if self.use_mock:
             return [], [], []
+        return super().extract_process_and_parameters(query)
 
-        query_lower = query.lower()
-        matched_processes = []
-        matched_parameters = []
-
-        # Match process names
-        for process in self.process_names:
-            if process in query_lower:
-                matched_processes.append(process)
-
-        # Match parameters
-        for param_list in self.process_parameters.values():
-            for param in param_list:
-                if param.lower() in query_lower:
-                    matched_parameters.append(param)
-
-        # Capture article numbers (4-6 digits)
-        all_numbers = re.findall(r"\b\d{4,6}\b", query_lower)
-        articles = []
-
-        for number in all_numbers:
-            # Check if it's preceded by a keyword like "around", "near to", etc.
-            keyword_pattern = rf"(around|close to|less than|greater than|near to|more than)\s+{number}"
-            is_keyworded = re.search(keyword_pattern, query_lower)
+    def retrieve(self, query, k=30, content_limit=None):
+        """Top-k Documents; only the first `content_limit` get their content
 
-            # Explicit "article 8090" capture
-            explicit_pattern = rf"article\s+{number}"
-            is_explicit = re.search(explicit_pattern, query_lower)
-
-            if is_explicit or not is_keyworded:
-                articles.append(number)
-
-        return matched_processes, matched_parameters, list(set(articles))
-
-    def retrieve(self, query, k=30):
-        """Main retrieval method"""
+        Documents past `content_limit` have empty page_content.
+        """
         if self.use_mock:
             return self._mock_retrieve(query, k)
 
         try:
-            if self.debug_mode:
-                st.write(f"📡 Sending hybrid query to Weaviate: '{query}'")
-
-            # Generate query vector
-            query_vector = self.embedder.encode(
-                query, normalize_embeddings=True
-            ).tolist()
-
-            # Extract filters
-            processes, parameters, articles = self.extract_process_and_parameters(query)
-
-            if self.debug_mode:
-                st.write(f"🔍 Matched Processes: {processes}")
-                st.write(f"🔍 Matched Parameters: {parameters}")
-                st.write(f"🔍 Matched Articles: {articles}")
-
-            # Build filters
-            article_filters = [
-                {"path": ["article"], "operator": "Equal", "valueText": art}
-                for art in articles
-            ]
-            param_filters = [
-                {
-                    "path": ["parameter_names"],
-                    "operator": "ContainsAny",
-                    "valueText": [param.lower()],
-                }
-                for param in parameters
-            ]
-            stage_filters = [
-                {"path": ["stage"], "operator": "Equal", "valueText": stage.lower()}
-                for stage in processes
-            ]
-
-            compound_filters = []
-            if article_filters:
-                compound_filters.append({"operator": "Or", "operands": article_filters})
-            if param_filters:
-                compound_filters.append({"operator": "Or", "operands": param_filters})
-            if stage_filters:
-                compound_filters.append({"operator": "Or", "operands": stage_filters})
-
-            where_filter = (
-                {"operator": "And", "operands": compound_filters}
-                if compound_filters
-                else None
-            )
-
-            if where_filter and self.debug_mode:
-                st.write(f"🔍 Filters Applied: {json.dumps(where_filter, indent=2)}")
-
-            # Query with filters
-            query_obj = self.client.query.get(CLASS_NAME, ["content", "metadata"])
-            if where_filter:
-                query_obj = query_obj.with_where(where_filter)
-
-            response = (
-                query_obj.with_hybrid(query=query, vector=query_vector, alpha=0.5)
-                .with_limit(k)
-                .do()
-            )
-
-            raw_hits = response.get("data", {}).get("Get", {}).get(CLASS_NAME)
-
-            # Fallback: No hits with filters
-            if not raw_hits and where_filter:
-                if self.debug_mode:
-                    st.warning(
-                        "⚠️ No results with metadata filter. Retrying without filter..."
-                    )
-
-                response = (
-                    self.client.query.get(CLASS_NAME, ["content", "metadata"])
-                    .with_hybrid(query=query, vector=query_vector, alpha=0.5)
-                    .with_limit(k)
-                    .do()
+            results = [
+                Document(
+                    page_content=hit.get("content", ""), metadata=hit_metadata(hit)
                 )
-                raw_hits = response.get("data", {}).get("Get", {}).get(CLASS_NAME)
-
-            if not raw_hits:
-                if self.debug_mode:
-                    st.warning("⚠️ Still no results after fallback.")
-                return []
-
-            # Process results
-            results = []
-            for hit in raw_hits:
-                content = hit.get("content", "")
-                meta = hit.get("metadata", {})
-                if isinstance(meta, str):
-                    try:
-                        meta = json.loads(meta)
-                    except:
-                        meta = {"raw": meta}
-                results.append(Document(page_content=content, metadata=meta))
-
-            if self.debug_mode:
-                st.write(f"✅ Retrieved {len(results)} documents.")
-
+                for hit in self.retrieve_hits(query, k, content_limit)
+            ]
+            if results:
+                self.log(f"✅ Retrieved {len(results)} documents.")
             return results
 
         except Exception as e:
@@ -2446,6 +2389,27 @@ class WeaviateHybridRetriever:
                 st.error(f"❌ Retrieval error: {str(e)}")
             return []
 
+    def cached_answer(self, query, query_type):
+        """Answer of an earlier paraphrase of `query`, or None"""
+        if self.use_mock:
+            return None
+        return super().cached_answer(query, query_type)
+
+    def remember_answer(self, query, query_type, answer, chunks=None):
+        if self.use_mock:
+            return
+        super().remember_answer(query, query_type, answer, chunks)
+
+    def load_raw_metadata(self, metadata):
+        """Full metadata JSON for a retrieved hit, fetched only when needed"""
+        if self.use_mock:
+            return metadata
+        try:
+            return super().load_raw_metadata(metadata)
+        except Exception as e:
+            self.warn(f"⚠️ Could not load full metadata: {str(e)}")
+            return {}
+
     def _mock_retrieve(self, query, k):
         """Mock retrieval for demo purposes"""
         query_lower = query.lower()
@@ -2525,13 +2489,13 @@ def run_system_checks():
         }
 
     # 2. Check embedding model
-    if SENTENCE_TRANSFORMERS_AVAILABLE:
+    if EMBEDDINGS_AVAILABLE and backend_available():
         try:
-            model = SentenceTransformer(MODEL_NAME)
+            model = get_embedder(model_name=MODEL_NAME)
             test_embedding = model.encode("test")
             checks["embedding"] = {
                 "status": "success",
-                "message": f"Model loaded. Dimension: {len(test_embedding)}",
+                "message": f"Model loaded ({model.name} backend). Dimension: {len(test_embedding)}",
             }
         except Exception as e:
             checks["embedding"] = {
@@ -2541,7 +2505,9 @@ def run_system_checks():
     else:
         checks["embedding"] = {
             "status": "error",
-            "message": "SentenceTransformers not available",
+            "message": "Embedding backend not available (pip install sentence-transformers, "
+            "or onnxruntime + `python embedding_backends.py export` for EMBEDDING_BACKEND=onnx, "
+            "or a reachable t2v-transformers service for EMBEDDING_BACKEND=t2v)",
         }
 
     # 3. Check Azure OpenAI
@@ -2686,8 +2652,15 @@ def process_query(query, retriever, llm, prompter, analyzer, debug_mode=False):
 
         query_type = analyzer.analyze(query)
 
+        # Paraphrases of an answered question skip retrieval and the LLM
+        cached = retriever.cached_answer(query, query_type)
+        if cached:
+            if debug_mode:
+                st.write("⚡ Answer served from the semantic cache")
+            return cached
+
         # Retrieve documents
-        docs = retriever.retrieve(query, k=60)
+        docs = retriever.retrieve(query, k=60, content_limit=25)
 
         if debug_mode:
             st.write(f"📚 Retrieved {len(docs)} documents")
@@ -2716,12 +2689,14 @@ def process_query(query, retriever, llm, prompter, analyzer, debug_mode=False):
         # Generate response
         prompt = prompter.get_prompt(query_type, context, query)
 
+        llm_answered = False
         if llm and context:
             try:
                 response = llm.invoke(prompt)
                 answer = (
                     response.content if hasattr(response, "content") else str(response)
                 )
+                llm_answered = True
             except Exception as e:
                 if debug_mode:
                     st.error(f"LLM error: {str(e)}")
@@ -2743,6 +2718,9 @@ def process_query(query, retriever, llm, prompter, analyzer, debug_mode=False):
                 }
             )
 
+        # Only real LLM answers are worth serving again
+        if llm_answered:
+            retriever.remember_answer(query, query_type, answer, chunk_data)
         return answer, chunk_data
 
     except Exception as e:
@@ -2928,6 +2906,14 @@ def show_chat_interface():
     if st.session_state.debug_mode:
         with st.expander("🔧 Debug Information", expanded=False):
             show_system_status()
+            if not retriever.use_mock:
+                st.write("🧠 Query embedding cache:", retriever.embedding_cache.stats())
+                st.write("⚡ Semantic answer cache:", retriever.answer_cache.stats())
+                if retriever.retrieval_cache:
+                    st.write(
+                        "💾 Persistent retrieval cache:",
+                        retriever.retrieval_cache.stats(),
+                    )
 
     # Main chat area
     st.subheader("💬 Chat")
@@ -3036,7 +3022,12 @@ def show_chat_interface():
                     f"Chunk {chunk['chunk_id']} - Article: {chunk['article']}, Stage: {chunk['stage']}"
                 ):
                     st.write(f"**Content:** {chunk['content']}")
-                    st.write(f"**Metadata:** {chunk['metadata']}")
+                    # Full JSON only for the chunks shown; typed fields without it
+                    metadata = (
+                        retriever.load_raw_metadata(chunk["metadata"])
+                        or chunk["metadata"]
+                    )
+                    st.write(f"**Metadata:** {metadata}")
         else:
             st.write("No chunks retrieved.")
 
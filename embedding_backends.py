@@ -0,0 +1,461 @@
+"""
+Embedding backends for sentence-transformers/all-MiniLM-L6-v2.
+
+- "torch": the SentenceTransformer model (default)
+- "onnx":  an exported, int8-quantized ONNX copy of the same model, run on
+           CPU with onnxruntime. Much smaller resident memory and lower
+           per-query latency than torch.
+- "t2v":   the t2v-transformers inference container from docker-compose,
+           called over pooled HTTP. The Python process loads no model at
+           all, so app workers stay small and model compute scales on its
+           own. Point T2V_INFERENCE_URL at the service (default
+           http://localhost:8081).
+
+Every backend exposes `encode(sentences, batch_size=32,
+normalize_embeddings=False)` with the same return shapes as
+SentenceTransformer.encode, so callers can swap them freely. Pick one with
+the EMBEDDING_BACKEND env var or `get_embedder(backend=...)`.
+
+Usage:
+    python embedding_backends.py export             # export + quantize to ONNX
+    python embedding_backends.py parity             # cosine parity vs torch
+    python embedding_backends.py parity --candidate t2v
+    python embedding_backends.py bench              # latency / throughput / RSS
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_BACKEND = "torch"
+ONNX_MODEL_DIR = "onnx_minilm"
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+ONNX_CONFIG_FILE = "backend.json"
+MAX_SEQ_LENGTH = 256  # same truncation as the SentenceTransformer config
+PARITY_MIN_COSINE = 0.99
+T2V_INFERENCE_URL = "http://localhost:8081"
+T2V_MAX_WORKERS = 8  # concurrent requests per process (and pooled connections)
+T2V_TIMEOUT_SECONDS = 30
+T2V_RETRIES = 3
+
+SAMPLE_TEXTS = [
+    "What is the warp denier for article 8222?",
+    "beaming speed and reed pitch of article 8090",
+    "coating gsm of article 8228FT",
+    "Explain the sizing process",
+    "Compare processing temperature of 8222 vs 8090",
+    "In the Warping process of article 8222, the following parameters were recorded: total ends 6480; warping m/c speed 600.",
+]
+
+
+def _selected_backend(backend=None):
+    return (backend or os.getenv("EMBEDDING_BACKEND") or DEFAULT_BACKEND).lower()
+
+
+# ---------- BACKENDS ---------- #
+class TorchEmbedder:
+    """Thin wrapper around SentenceTransformer."""
+
+    name = "torch"
+
+    def __init__(self, model_name=MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, **kwargs):
+        return self.model.encode(
+            sentences,
+            batch_size=batch_size,
+            normalize_embeddings=normalize_embeddings,
+        )
+
+
+class OnnxEmbedder:
+    """Quantized ONNX export of the model, mean-pooled like SentenceTransformer."""
+
+    name = "onnx"
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, quantized=True, num_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        if not os.path.isdir(model_dir):
+            raise FileNotFoundError(
+                f"ONNX model not found in '{model_dir}'. "
+                "Run: python embedding_backends.py export"
+            )
+
+        config_path = os.path.join(model_dir, ONNX_CONFIG_FILE)
+        config = {}
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        self.model_name = config.get("model_name", MODEL_NAME)
+        self.max_seq_length = config.get("max_seq_length", MAX_SEQ_LENGTH)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        model_file = ONNX_INT8_FILE if quantized else ONNX_FP32_FILE
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _encode_batch(self, texts):
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        feed = {
+            name: tokens[name].astype(np.int64)
+            for name in self.input_names
+            if name in tokens
+        }
+        token_embeddings = self.session.run(None, feed)[0]
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 384), dtype=np.float32)
+
+        # Batch similar lengths together to keep padding small
+        order = np.argsort([-len(t) for t in texts])
+        parts = []
+        for start in range(0, len(texts), batch_size):
+            batch = [texts[i] for i in order[start : start + batch_size]]
+            parts.append(self._encode_batch(batch))
+        embeddings = np.concatenate(parts).astype(np.float32)
+        embeddings = embeddings[np.argsort(order)]
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+class RemoteEmbedder:
+    """Client for the t2v-transformers inference API (POST /vectors).
+
+    The service embeds one text per request, so a batch is sent as
+    concurrent requests over a keep-alive connection pool. Vectors are
+    L2-normalized here when asked, matching the local backends.
+    """
+
+    name = "t2v"
+
+    def __init__(
+        self,
+        url=None,
+        max_workers=T2V_MAX_WORKERS,
+        timeout=T2V_TIMEOUT_SECONDS,
+        retries=T2V_RETRIES,
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.url = (url or os.getenv("T2V_INFERENCE_URL", T2V_INFERENCE_URL)).rstrip(
+            "/"
+        )
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max_workers,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=None,  # POST /vectors is idempotent
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = None
+
+        meta = self.session.get(f"{self.url}/meta", timeout=timeout)
+        meta.raise_for_status()
+        self.model_name = meta.json().get("model", {}).get("_name_or_path", MODEL_NAME)
+
+    def _encode_one(self, text):
+        response = self.session.post(
+            f"{self.url}/vectors", json={"text": text}, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["vector"]
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 384), dtype=np.float32)
+
+        if len(texts) == 1:
+            vectors = [self._encode_one(texts[0])]
+        else:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="t2v"
+                )
+            vectors = list(self._executor.map(self._encode_one, texts))
+        embeddings = np.asarray(vectors, dtype=np.float32)
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+BACKENDS = {
+    "torch": TorchEmbedder,
+    "onnx": OnnxEmbedder,
+    "t2v": RemoteEmbedder,
+}
+
+
+def backend_available(backend=None):
+    """True if the libraries (and files) for the backend are present."""
+    backend = _selected_backend(backend)
+    try:
+        if backend == "torch":
+            import sentence_transformers  # noqa: F401
+        elif backend == "onnx":
+            import onnxruntime  # noqa: F401
+            import transformers  # noqa: F401
+
+            return os.path.isdir(os.getenv("ONNX_MODEL_DIR", ONNX_MODEL_DIR))
+        elif backend == "t2v":
+            import requests
+
+            url = os.getenv("T2V_INFERENCE_URL", T2V_INFERENCE_URL).rstrip("/")
+            try:
+                ready = requests.get(f"{url}/.well-known/ready", timeout=2)
+            except requests.RequestException:
+                return False
+            return ready.ok
+        else:
+            return False
+    except ImportError:
+        return False
+    return True
+
+
+def get_embedder(backend=None, model_name=MODEL_NAME):
+    """Instantiate the configured embedding backend."""
+    backend = _selected_backend(backend)
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend '{backend}'. Choose from {sorted(BACKENDS)}"
+        )
+    if backend == "onnx":
+        return OnnxEmbedder(os.getenv("ONNX_MODEL_DIR", ONNX_MODEL_DIR))
+    if backend == "t2v":
+        return RemoteEmbedder()
+    return TorchEmbedder(model_name)
+
+
+# ---------- EXPORT ---------- #
+def export_onnx(model_name=MODEL_NAME, output_dir=ONNX_MODEL_DIR, opset=14):
+    """Export the transformer to ONNX and write a dynamic int8-quantized copy."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model
+    transformer.config.return_dict = False
+    transformer.eval()
+    st_model.tokenizer.save_pretrained(output_dir)
+
+    dummy = st_model.tokenizer(["export sample"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(output_dir, ONNX_FP32_FILE)
+    int8_path = os.path.join(output_dir, ONNX_INT8_FILE)
+    print(f"📦 Exporting {model_name} to {fp32_path} ...")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    print(f"🗜️ Quantizing to int8: {int8_path} ...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "model_name": model_name,
+                "max_seq_length": st_model.max_seq_length or MAX_SEQ_LENGTH,
+                "pooling": "mean",
+                "quantization": "dynamic-int8",
+            },
+            f,
+            indent=2,
+        )
+    print(
+        f"✅ Export complete. fp32: {os.path.getsize(fp32_path) / 1e6:.1f} MB | "
+        f"int8: {os.path.getsize(int8_path) / 1e6:.1f} MB"
+    )
+
+
+# ---------- PARITY + BENCHMARK ---------- #
+def load_sample_texts(chunk_file=None, limit=256):
+    """Chunk contents from the combined chunk file, or built-in samples."""
+    if chunk_file and os.path.exists(chunk_file):
+        from itertools import islice
+
+        from core_embedding import iter_chunks
+
+        chunks = islice(iter_chunks(chunk_file), limit)
+        texts = [c.get("content", "") for c in chunks if c.get("content")]
+        if texts:
+            return texts
+    return SAMPLE_TEXTS
+
+
+def parity_check(texts, reference="torch", candidate="onnx"):
+    """Cosine similarity between two backends on the same texts."""
+    ref = get_embedder(reference).encode(texts, normalize_embeddings=True)
+    cand = get_embedder(candidate).encode(texts, normalize_embeddings=True)
+    cosines = np.sum(ref * cand, axis=1)
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "passed": bool(cosines.min() >= PARITY_MIN_COSINE),
+    }
+
+
+def _rss_mb():
+    """Current resident set size of this process in MB (Linux), else peak RSS."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _bench_worker(backend, texts, batch_size, repeats, results):
+    rss_before = _rss_mb()
+    load_started = time.perf_counter()
+    embedder = get_embedder(backend)
+    load_seconds = time.perf_counter() - load_started
+    embedder.encode(texts[:2], normalize_embeddings=True)  # warm-up
+
+    latencies = []
+    for _ in range(repeats):
+        for text in texts[:32]:
+            started = time.perf_counter()
+            embedder.encode(text, normalize_embeddings=True)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    embedder.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    throughput = len(texts) / (time.perf_counter() - started)
+
+    latencies.sort()
+    results[backend] = {
+        "load_seconds": round(load_seconds, 2),
+        "query_p50_ms": round(statistics.median(latencies), 2),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "throughput_texts_per_s": round(throughput, 1),
+        "rss_mb": round(_rss_mb(), 1),
+        "model_rss_mb": round(_rss_mb() - rss_before, 1),
+    }
+
+
+def benchmark(texts, backends=("torch", "onnx"), batch_size=32, repeats=3):
+    """Run each backend in its own process so RSS numbers don't mix."""
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Manager() as manager:
+        results = manager.dict()
+        for backend in backends:
+            proc = ctx.Process(
+                target=_bench_worker,
+                args=(backend, texts, batch_size, repeats, results),
+            )
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0:
+                results[backend] = {"error": f"exit code {proc.exitcode}"}
+        return dict(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embedding backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = sub.add_parser("export", help="export and quantize the ONNX model")
+    export_cmd.add_argument("--model-name", default=MODEL_NAME)
+    export_cmd.add_argument("--output-dir", default=ONNX_MODEL_DIR)
+
+    for name in ("parity", "bench"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("--chunk-file", default="all_combined_chunks1.json")
+        cmd.add_argument("--limit", type=int, default=256)
+    sub.choices["parity"].add_argument(
+        "--candidate", choices=sorted(BACKENDS), default="onnx"
+    )
+    sub.choices["bench"].add_argument("--batch-size", type=int, default=32)
+    sub.choices["bench"].add_argument("--repeats", type=int, default=3)
+    sub.choices["bench"].add_argument(
+        "--backends", nargs="+", default=["torch", "onnx"]
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        export_onnx(args.model_name, args.output_dir)
+        return
+
+    texts = load_sample_texts(args.chunk_file, args.limit)
+    if args.command == "parity":
+        result = parity_check(texts, candidate=args.candidate)
+        status = "✅" if result["passed"] else "❌"
+        print(f"{status} Parity on {result['texts']} texts: {json.dumps(result)}")
+    else:
+        results = benchmark(texts, args.backends, args.batch_size, args.repeats)
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
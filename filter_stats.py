@@ -0,0 +1,166 @@
+"""
+Filter-selectivity statistics collected at ingest and the query planner
+that uses them.
+
+Ingestion counts detail chunks per article, stage, parameter name and
+(stage, parameter) pair and stores the counts in the index metadata. The
+retrievers plan each where-filter against them before sending it: clauses
+that can't match are dropped, a stage that never co-occurs with the asked
+parameters is relaxed, and the filtered query's k is capped at the number
+of candidates it can return. Filters that still came back empty are
+remembered, so the same question goes straight to the unfiltered query,
+and filters the counts prove non-empty skip the unfiltered fallback.
+"""
+
+import json
+import threading
+from collections import Counter, OrderedDict
+
+EMPTY_FILTER_CACHE_SIZE = 1024
+MIN_FILTER_CANDIDATES = 3  # fewer expected hits than this is over-narrow
+
+
+class FilterStatsBuilder:
+    """Counts prepared chunk records; summaries are not filter targets."""
+
+    def __init__(self):
+        self.total = 0
+        self.articles = Counter()
+        self.stages = Counter()
+        self.parameters = Counter()
+        self.stage_parameters = {}
+
+    def add(self, record):
+        if record.get("doc_type", "chunk") != "chunk":
+            return
+        self.total += 1
+        self.articles[record["article"]] += 1
+        stage = record.get("stage") or ""
+        if stage:
+            self.stages[stage] += 1
+        pairs = self.stage_parameters.setdefault(stage, Counter()) if stage else None
+        for param in set(record.get("parameter_names") or []):
+            self.parameters[param] += 1
+            if pairs is not None:
+                pairs[param] += 1
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "articles": dict(self.articles),
+            "stages": dict(self.stages),
+            "parameters": dict(self.parameters),
+            "stage_parameters": {
+                stage: dict(params) for stage, params in self.stage_parameters.items()
+            },
+        }
+
+
+class FilterPlanner:
+    """Plans where-filters from the ingest statistics; thread-safe.
+
+    Without statistics (indexes built before they existed) every plan is
+    passed through unchanged.
+    """
+
+    def __init__(self, maxsize=EMPTY_FILTER_CACHE_SIZE):
+        self.stats = None
+        self.index_version = None
+        self.maxsize = maxsize
+        self._empty = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, stats, index_version):
+        """Use the statistics of a (possibly new) ingestion version."""
+        with self._lock:
+            if index_version != self.index_version:
+                self._empty.clear()
+                self.index_version = index_version
+            self.stats = stats or None
+
+    def plan(self, processes, parameters, articles, k):
+        """(processes, parameters, articles, filtered_k, notes) to filter on."""
+        stats = self.stats
+        if not stats:
+            return processes, parameters, articles, k, []
+        notes = []
+
+        def keep(values, counts, label, lower=True):
+            kept = [v for v in values if counts.get(v.lower() if lower else v, 0)]
+            if len(kept) < len(values):
+                dropped = sorted(set(values) - set(kept))
+                notes.append(f"no chunks for {label} {dropped}")
+            return kept
+
+        articles = keep(articles, stats["articles"], "article", lower=False)
+        parameters = keep(parameters, stats["parameters"], "parameter")
+        processes = keep(processes, stats["stages"], "stage")
+
+        pair_count = sum(
+            stats["stage_parameters"].get(stage.lower(), {}).get(param.lower(), 0)
+            for stage in processes
+            for param in parameters
+        )
+        if processes and parameters and pair_count < MIN_FILTER_CANDIDATES:
+            # The parameters already pin the stage down; keep the more specific
+            notes.append(f"relaxed stage {processes}: {pair_count} chunks with both")
+            processes = []
+            pair_count = 0
+
+        # Upper bound on what the filter can return
+        bounds = []
+        if articles:
+            bounds.append(sum(stats["articles"][a] for a in articles))
+        if pair_count:
+            bounds.append(pair_count)
+        elif parameters:
+            bounds.append(sum(stats["parameters"][p.lower()] for p in parameters))
+        elif processes:
+            bounds.append(sum(stats["stages"][s.lower()] for s in processes))
+        filtered_k = min([k] + bounds)
+        return processes, parameters, articles, max(filtered_k, 1), notes
+
+    def is_known_nonempty(self, processes, parameters, articles):
+        """True if the counts prove the filter on these values matches chunks.
+
+        That holds for a single clause (any of its values occurs) and for
+        stage AND parameter (a pair co-occurs); ANDs involving articles are
+        never proven, there are no per-article pair counts.
+        """
+        stats = self.stats
+        if not stats:
+            return False
+        clauses = [
+            (articles, stats["articles"], False),
+            (parameters, stats["parameters"], True),
+            (processes, stats["stages"], True),
+        ]
+        clauses = [clause for clause in clauses if clause[0]]
+        if len(clauses) == 1:
+            values, counts, lower = clauses[0]
+            return any(counts.get(v.lower() if lower else v, 0) for v in values)
+        if articles:
+            return False
+        return any(
+            stats["stage_parameters"].get(stage.lower(), {}).get(param.lower(), 0)
+            for stage in processes
+            for param in parameters
+        )
+
+    @staticmethod
+    def _key(where_filter):
+        return json.dumps(where_filter, sort_keys=True)
+
+    def is_known_empty(self, where_filter):
+        with self._lock:
+            key = self._key(where_filter)
+            if key in self._empty:
+                self._empty.move_to_end(key)
+                return True
+            return False
+
+    def mark_empty(self, where_filter):
+        with self._lock:
+            self._empty[self._key(where_filter)] = None
+            while len(self._empty) > self.maxsize:
+                self._empty.popitem(last=False)
@@ -0,0 +1,435 @@
+"""
+Query pipeline shared by the retrievers in core_chatbot.py and core_ui.py.
+
+HybridRetrieverBase turns a question into raw Weaviate-shaped hits: entity
+and article extraction, filter planning, the article-index lookup, article
+summaries, the filtered hybrid search with its concurrent unfiltered
+fallback, the persistent retrieval cache and lazy content loading. The
+front-ends only set up the client (or the local artifact index), wrap hits
+in Documents and decide where progress messages go via log() / warn().
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from article_index import read_article_chunks
+from article_summaries import SUMMARY_DETAIL_K, SUMMARY_SOURCE, is_broad_article_query
+from filter_stats import FilterPlanner
+from index_metadata import chunk_classes, read_index_metadata
+from retrieval_cache import (
+    INDEX_VERSION_REFRESH_SECONDS,
+    EmbeddingCache,
+    PersistentRetrievalCache,
+    SemanticAnswerCache,
+    query_signature,
+)
+from retrieval_utils import (
+    CONCURRENT_FALLBACK,
+    FALLBACK_WORKERS,
+    and_filter,
+    article_filter,
+    doc_type_filter,
+    extract_article_numbers,
+    fetch_article_chunks,
+    fetch_article_summaries,
+    hybrid_query,
+    interleave,
+    is_article_only_query,
+    lean_properties,
+    load_hit_content,
+    load_raw_metadata,
+    partitioned_hybrid_query,
+    result_properties,
+    search_with_fallback,
+    source_class_name,
+)
+from textile_matcher import EntityMatcher
+
+
+class HybridRetrieverBase:
+    """Hybrid retrieval over one chunk class (or its source partitions).
+
+    Subclasses set `client` and `class_name`, call _init_index_classes()
+    (or set the same attributes for the local index), _init_query_state()
+    and _init_entity_matcher() once `process_names` / `process_parameters`
+    exist, and wrap retrieve_hits() results in Documents.
+    """
+
+    local_index = None  # LocalHybridIndex serving the artifact instead of Weaviate
+
+    def _init_index_classes(self):
+        """Partitions, thread pools and result properties of the Weaviate index."""
+        # Classes of the last ingestion, per its metadata: per-source classes
+        # (TextileChunk_Route, ...) if it was partitioned, with the article
+        # summaries in a partition of their own
+        metadata = read_index_metadata(self.client, self.class_name)
+        classes = chunk_classes(metadata, self.class_name)
+        summary_class = source_class_name(self.class_name, SUMMARY_SOURCE)
+        self.partitions = [
+            name for name in classes if name not in (self.class_name, summary_class)
+        ]
+        self.executor = (
+            ThreadPoolExecutor(max_workers=len(self.partitions))
+            if self.partitions
+            else None
+        )
+        # Separate pool: fallback queries fan out over `executor` themselves
+        self.fallback_executor = (
+            ThreadPoolExecutor(max_workers=FALLBACK_WORKERS)
+            if CONCURRENT_FALLBACK
+            else None
+        )
+        # Typed metadata properties (or the legacy JSON blob on old indexes)
+        self.result_properties = result_properties(
+            self.client, (self.partitions or [self.class_name])[0]
+        )
+        # Searches skip `content` where possible; retrieve_hits() fetches it by id
+        self.hit_properties = (
+            lean_properties(self.result_properties) or self.result_properties
+        )
+        # Every chunk class has `doc_type`; only the count says summaries exist
+        if not metadata.get("article_summaries"):
+            self.summary_class = None  # ingested with --no-article-summaries
+        elif summary_class in classes:
+            self.summary_class = summary_class
+        else:
+            self.summary_class = self.class_name
+
+    def _init_query_state(self):
+        """Caches and the state refreshed from the index metadata."""
+        self.embedding_cache = EmbeddingCache()
+        self.answer_cache = SemanticAnswerCache()
+        # Hits shared by all app workers via SQLite; off unless RETRIEVAL_CACHE_PATH
+        self.retrieval_cache = PersistentRetrievalCache.from_env()
+        self._index_version = None
+        self._version_checked_at = float("-inf")
+        self.known_articles = None  # any number counts until metadata says otherwise
+        self.filter_planner = FilterPlanner()
+        self.article_index = False  # set from the index metadata
+
+    def _init_entity_matcher(self):
+        self.entity_matcher = EntityMatcher(
+            {
+                "process": self.process_names,
+                "parameter": [
+                    param
+                    for params in self.process_parameters.values()
+                    for param in params
+                ],
+            }
+        )
+
+    def log(self, message):
+        print(message)
+
+    def warn(self, message):
+        print(message)
+
+    def extract_process_and_parameters(self, query):
+        query_lower = query.lower()
+
+        # Processes and parameters in one word-bounded, longest-match pass
+        matched = self.entity_matcher.match(query_lower)
+
+        # Article numbers, kept only if ingestion saw that article
+        self.index_version()  # refreshes known_articles with the version
+        articles = extract_article_numbers(query_lower, self.known_articles)
+
+        return matched["process"], matched["parameter"], articles
+
+    def retrieve_hits(self, query, k=30, content_limit=None):
+        """Top-k raw hits; only the first `content_limit` get their content.
+
+        Hits are searched without `content` (id, score, article, stage, token
+        count, ...) where the index allows it, and the content of the kept
+        ones is fetched in one bulk Get afterwards.
+        """
+        processes, parameters, articles = self.extract_process_and_parameters(query)
+        self.log(f"🔍 Matched Processes: {processes}")
+        self.log(f"🔍 Matched Parameters: {parameters}")
+        self.log(f"🔍 Matched Articles: {articles}")
+
+        # Drop or relax clauses the ingest statistics say can't match
+        processes, parameters, articles, filtered_k, notes = self.filter_planner.plan(
+            processes, parameters, articles, k
+        )
+        for note in notes:
+            self.log(f"🧮 Filter plan: {note}")
+
+        # Article-only questions: the article's chunks by id, no embedding
+        raw_hits = self.article_lookup(query, processes, parameters, articles, k)
+        if raw_hits:
+            self.log(f"📇 Fetched {len(raw_hits)} documents of {articles} by id")
+        else:
+            raw_hits = self.hybrid_hits(
+                query, processes, parameters, articles, k, filtered_k
+            )
+
+        if not raw_hits:
+            self.warn("⚠️ Still no results after fallback.")
+            return []
+        self.load_content(raw_hits[:content_limit])
+        return raw_hits
+
+    def hybrid_hits(self, query, processes, parameters, articles, k, filtered_k):
+        """Raw hits of the (filtered, with fallback) hybrid search."""
+        self.log(f"📡 Sending hybrid query: '{query}'")
+        query_vector = self.embed_query(query)
+
+        # Broad article questions: summaries plus a few detail chunks
+        raw_hits = self.article_overview(
+            query, query_vector, processes, parameters, articles, k
+        )
+        if raw_hits:
+            self.log(f"📝 Using article summaries for {articles}")
+            return raw_hits
+
+        where_filter = self.build_where_filter(processes, parameters, articles)
+        if where_filter:
+            self.log(f"🔍 Filters Applied: {json.dumps(where_filter, indent=2)}")
+        if where_filter and self.filter_planner.is_known_empty(where_filter):
+            self.log("⏭️ Filter matched nothing before, querying without it")
+            where_filter = None
+
+        # Filtered query, with the unfiltered fallback sent alongside it
+        # unless the ingest counts prove the filter can't come back empty
+        fallback_executor = self.fallback_executor
+        if where_filter and self.filter_planner.is_known_nonempty(
+            processes, parameters, articles
+        ):
+            fallback_executor = None  # still falls back if it does
+        raw_hits, filtered = search_with_fallback(
+            fallback_executor,
+            lambda where: self.search(
+                query, query_vector, where, filtered_k if where else k
+            ),
+            where_filter,
+        )
+        if where_filter and not filtered:
+            self.filter_planner.mark_empty(where_filter)
+            self.warn("⚠️ No results with metadata filter. Using unfiltered results...")
+        return raw_hits
+
+    def embed_query(self, query):
+        """Normalized query vector, served from the LRU cache when repeated."""
+        return self.embedding_cache.get_or_compute(
+            query,
+            lambda: self.embedder.encode(query, normalize_embeddings=True).tolist(),
+        )
+
+    def index_version(self):
+        """Ingestion version of the index, re-read at most every few seconds."""
+        now = time.monotonic()
+        if now - self._version_checked_at > INDEX_VERSION_REFRESH_SECONDS:
+            if self.local_index is not None:
+                metadata = self.local_index.metadata
+            else:
+                metadata = read_index_metadata(self.client, self.class_name)
+            self._index_version = metadata.get("ingestion_version")
+            if "known_articles" in metadata:
+                self.known_articles = frozenset(metadata["known_articles"])
+            self.article_index = bool(metadata.get("article_index"))
+            self.filter_planner.update(
+                metadata.get("filter_stats"), self._index_version
+            )
+            self._version_checked_at = now
+        return self._index_version
+
+    def answer_signature(self, query, query_type):
+        return query_signature(
+            query_type, *self.extract_process_and_parameters(query), query=query
+        )
+
+    def cached_answer(self, query, query_type):
+        """Answer of an earlier paraphrase of `query`, or None."""
+        return self.answer_cache.lookup(
+            self.embed_query(query),
+            self.answer_signature(query, query_type),
+            self.index_version(),
+        )
+
+    def remember_answer(self, query, query_type, answer, chunks=None):
+        self.answer_cache.store(
+            self.embed_query(query),
+            self.answer_signature(query, query_type),
+            answer,
+            chunks,
+            self.index_version(),
+        )
+
+    def build_where_filter(self, processes, parameters, articles):
+        """AND of (any article) (any parameter) (any stage); None if nothing matched."""
+        article_filters = [
+            {"path": ["article"], "operator": "Equal", "valueText": art}
+            for art in articles
+        ]
+        param_filters = [
+            {
+                "path": ["parameter_names"],
+                "operator": "ContainsAny",
+                "valueText": [param.lower()],
+            }
+            for param in parameters
+        ]
+        stage_filters = [
+            {"path": ["stage"], "operator": "Equal", "valueText": stage.lower()}
+            for stage in processes
+        ]
+
+        compound_filters = []
+        if article_filters:
+            compound_filters.append({"operator": "Or", "operands": article_filters})
+        if param_filters:
+            compound_filters.append({"operator": "Or", "operands": param_filters})
+        if stage_filters:
+            compound_filters.append({"operator": "Or", "operands": stage_filters})
+
+        if not compound_filters:
+            return None
+        return {"operator": "And", "operands": compound_filters}
+
+    def article_summaries(self, articles):
+        if self.local_index is not None:
+            return self.local_index.article_summaries(articles)
+        return fetch_article_summaries(
+            self.client, self.summary_class, self.hit_properties, articles
+        )
+
+    def article_lookup(self, query, processes, parameters, articles, k):
+        """Chunks of the named articles in stage order, fetched by id.
+
+        Only when the query is nothing but article numbers and stage names
+        (e.g. "8222 warping", "article 8222 details"), so the chunks need no
+        ranking; [] otherwise. Without a stage the article summaries lead,
+        followed by the first few chunks, so these broad questions skip the
+        query embedding and the overview search too. Several articles share
+        k round-robin, so none of them is cut off.
+        """
+        if parameters or not self.article_index:
+            return []
+        if not is_article_only_query(query.lower(), processes, articles):
+            return []
+        if self.local_index is not None:
+            per_article = self.local_index.article_chunks(articles)
+        else:
+            per_article = read_article_chunks(self.client, self.class_name, articles)
+        summaries = []
+        if processes:
+            stages = {stage.lower() for stage in processes}
+            per_article = [
+                [entry for entry in entries if entry[1] in stages]
+                for entries in per_article
+            ]
+        elif self.summary_class:
+            summaries = self.article_summaries(articles)
+            if summaries:
+                k = min(k, SUMMARY_DETAIL_K)
+        entries = interleave(per_article, k)
+        if not entries:
+            return summaries
+        if self.local_index is not None:
+            chunks = self.local_index.hits_by_id([entry[0] for entry in entries])
+        else:
+            chunks = fetch_article_chunks(
+                self.client, self.hit_properties, entries, bool(self.partitions)
+            )
+        return summaries + chunks
+
+    def article_overview(self, query, query_vector, processes, parameters, articles, k):
+        """Summaries of the named articles plus a few detail chunks, or []."""
+        if not self.summary_class or not is_broad_article_query(
+            processes, parameters, articles
+        ):
+            return []
+        summaries = self.article_summaries(articles)
+        if not summaries:
+            return []
+        details = self.search(
+            query, query_vector, article_filter(articles), min(k, SUMMARY_DETAIL_K)
+        )
+        return summaries + details
+
+    def search(self, query, query_vector, where_filter, k):
+        """Hybrid search; partitioned indexes are queried per source and fused.
+
+        With a persistent retrieval cache, hits are looked up by (filter plan,
+        query, query vector, k) under the current ingestion version first.
+        """
+        index_version = self.index_version() if self.retrieval_cache else None
+        if not index_version:
+            # Without an ingestion version the cache could never be invalidated
+            return self._search(query, query_vector, where_filter, k)
+
+        plan = {
+            "where": where_filter,
+            "classes": self.partitions or [self.class_name],
+            "properties": self.hit_properties,
+        }
+        raw_hits = self.retrieval_cache.get(plan, query, query_vector, k, index_version)
+        if raw_hits is None:
+            raw_hits = self._search(query, query_vector, where_filter, k)
+            self.retrieval_cache.put(
+                plan, query, query_vector, k, index_version, raw_hits
+            )
+        return raw_hits
+
+    def _search(self, query, query_vector, where_filter, k):
+        if self.summary_class == self.class_name:
+            # Summaries share the class; plain searches only rank detail chunks
+            where_filter = and_filter(where_filter, doc_type_filter("chunk"))
+        if self.local_index is not None:
+            return self.local_index.search(query, query_vector, where_filter, k)
+        if self.partitions:
+            return partitioned_hybrid_query(
+                self.client,
+                self.executor,
+                self.partitions,
+                self.hit_properties,
+                query,
+                query_vector,
+                where_filter,
+                k,
+            )
+        return hybrid_query(
+            self.client,
+            self.class_name,
+            self.hit_properties,
+            query,
+            query_vector,
+            where_filter,
+            k,
+        )
+
+    def load_content(self, hits):
+        """Fetch `content` of lean hits in place (one Get per class).
+
+        With a persistent retrieval cache, content loaded before under the
+        current ingestion version is taken from there first.
+        """
+        if self.local_index is not None:
+            return
+        index_version = self.index_version() if self.retrieval_cache else None
+        if index_version:
+            cached = self.retrieval_cache.get_content(
+                [hit["_additional"]["id"] for hit in hits if "content" not in hit],
+                index_version,
+            )
+            for hit in hits:
+                if "content" not in hit and hit["_additional"]["id"] in cached:
+                    hit["content"] = cached[hit["_additional"]["id"]]
+        missing = [hit for hit in hits if "content" not in hit]
+        if not missing:
+            return
+        load_hit_content(self.client, self.class_name, missing)
+        if index_version:
+            self.retrieval_cache.put_content(
+                {hit["_additional"]["id"]: hit["content"] for hit in missing},
+                index_version,
+            )
+
+    def load_raw_metadata(self, metadata):
+        """Full metadata JSON for a retrieved hit, fetched only when needed."""
+        if self.local_index is not None:
+            return self.local_index.raw_metadata(metadata.get("_id"))
+        return load_raw_metadata(self.client, self.class_name, metadata)
@@ -0,0 +1,92 @@
+"""
+Index metadata stored next to the chunks in Weaviate.
+
+Ingestion records what an index was built from (chunk-file fingerprint,
+model, ingestion version, classes, counts) as one object per chunk class in
+a small vector-less class. Keeping it inside Weaviate means every app
+process can read it and backups/snapshots carry it along with the data.
+"""
+
+import json
+import time
+import uuid as uuid_lib
+
+META_CLASS_NAME = "TextileIndexMeta"
+
+
+def _meta_uuid(class_name):
+    from weaviate.util import generate_uuid5
+
+    return generate_uuid5(class_name, "index-metadata")
+
+
+def ensure_meta_class(client):
+    if client.schema.exists(META_CLASS_NAME):
+        return
+    client.schema.create_class(
+        {
+            "class": META_CLASS_NAME,
+            "vectorizer": "none",
+            "vectorIndexConfig": {"skip": True},
+            "properties": [
+                {
+                    "name": "index_class",
+                    "dataType": ["text"],
+                    "tokenization": "field",
+                },
+                {
+                    "name": "payload",
+                    "dataType": ["text"],
+                    "indexSearchable": False,
+                    "indexFilterable": False,
+                },
+            ],
+        }
+    )
+
+
+def read_index_metadata(client, class_name):
+    """Metadata written by the last ingestion of `class_name`, or {}."""
+    try:
+        obj = client.data_object.get_by_id(
+            _meta_uuid(class_name), class_name=META_CLASS_NAME
+        )
+    except Exception:
+        return {}
+    payload = ((obj or {}).get("properties") or {}).get("payload")
+    return json.loads(payload) if payload else {}
+
+
+def write_index_metadata(client, class_name, **fields):
+    """Merge `fields` into the stored metadata of `class_name`.
+
+    Every write gets a fresh `ingestion_version`, so caches keyed on it are
+    invalidated whenever the index changes.
+    """
+    ensure_meta_class(client)
+    metadata = read_index_metadata(client, class_name)
+    metadata.update(fields)
+    metadata["class_name"] = class_name
+    metadata["ingestion_version"] = uuid_lib.uuid4().hex
+    metadata["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    store_index_metadata(client, class_name, metadata)
+    return metadata
+
+
+def store_index_metadata(client, class_name, metadata):
+    """Write `metadata` as is (e.g. from a snapshot), keeping its version."""
+    ensure_meta_class(client)
+    data_object = {"index_class": class_name, "payload": json.dumps(metadata)}
+    object_id = _meta_uuid(class_name)
+    if client.data_object.exists(object_id, class_name=META_CLASS_NAME):
+        client.data_object.replace(data_object, META_CLASS_NAME, object_id)
+    else:
+        client.data_object.create(data_object, META_CLASS_NAME, uuid=object_id)
+
+
+def chunk_classes(metadata, class_name):
+    """Classes the last ingestion wrote to (partitions included).
+
+    Indexes ingested before the metadata recorded them are a single class.
+    """
+    return list(metadata.get("classes") or [class_name])
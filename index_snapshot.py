@@ -0,0 +1,320 @@
+"""
+Snapshot and restore the Weaviate index with the backup-filesystem module.
+
+Restoring a snapshot brings a lost volume or a new replica back in minutes
+instead of rerunning the ingestion chain and re-embedding every chunk.
+Weaviate writes the backup files under BACKUP_FILESYSTEM_PATH (mounted to
+./backups in docker-compose.yml); next to them (and in SNAPSHOT_DIR, for
+`list`) we keep a small manifest per snapshot with the classes, object
+counts, chunk-file fingerprint and model, so a restore can be checked
+before and after. The manifest travels with ./backups, so a new host can
+restore without the local snapshots/ directory.
+
+The helper classes (index metadata, article index) are shared by every
+indexed chunk class, so they are never part of the Weaviate backup. The
+manifest carries this class's objects from them instead, and a restore
+writes those back without touching other classes' entries.
+
+Usage:
+    python index_snapshot.py create [--backup-id textile-20250707]
+    python index_snapshot.py list
+    python index_snapshot.py restore textile-20250707 [--replace] [--allow-stale]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from weaviate import Client as WeaviateClient
+
+from core_embedding import (
+    CHUNK_FILE,
+    CLASS_NAME,
+    MODEL_NAME,
+    WEAVIATE_URL,
+    file_fingerprint,
+)
+from index_metadata import (
+    META_CLASS_NAME,
+    chunk_classes,
+    read_index_metadata,
+    store_index_metadata,
+)
+from article_index import (
+    ARTICLE_INDEX_CLASS_NAME,
+    export_article_index,
+    import_article_index_objects,
+)
+
+BACKUP_BACKEND = "filesystem"
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")  # host side of BACKUP_FILESYSTEM_PATH
+SNAPSHOT_DIR = "snapshots"
+SHARED_CLASSES = (META_CLASS_NAME, ARTICLE_INDEX_CLASS_NAME)
+
+
+def index_classes(client, class_name=CLASS_NAME):
+    """Classes of the last ingestion (per its metadata); never the shared helpers."""
+    metadata = read_index_metadata(client, class_name)
+    return [
+        name
+        for name in chunk_classes(metadata, class_name)
+        if client.schema.exists(name)
+    ]
+
+
+def class_counts(client, classes):
+    counts = {}
+    for class_name in classes:
+        result = client.query.aggregate(class_name).with_meta_count().do()
+        groups = result.get("data", {}).get("Aggregate", {}).get(class_name) or [{}]
+        counts[class_name] = groups[0].get("meta", {}).get("count", 0)
+    return counts
+
+
+def _manifest_path(backup_id, snapshot_dir):
+    return os.path.join(snapshot_dir, f"{backup_id}.json")
+
+
+def _write_manifest(manifest, directory):
+    os.makedirs(directory, exist_ok=True)
+    path = _manifest_path(manifest["backup_id"], directory)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def load_manifest(backup_id, snapshot_dir=SNAPSHOT_DIR, backup_dir=BACKUP_DIR):
+    """Manifest next to the backup files, else the local snapshots/ copy."""
+    for directory in (backup_dir, snapshot_dir):
+        path = _manifest_path(backup_id, directory)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    raise ValueError(
+        f"❌ No manifest for snapshot {backup_id} in {backup_dir} or {snapshot_dir}"
+    )
+
+
+def create_snapshot(
+    client,
+    class_name=CLASS_NAME,
+    backup_id=None,
+    snapshot_dir=SNAPSHOT_DIR,
+    chunk_file=CHUNK_FILE,
+    backup_dir=BACKUP_DIR,
+):
+    backup_id = backup_id or f"textile-{time.strftime('%Y%m%d-%H%M%S')}"
+    if not re.fullmatch(r"[a-z0-9_-]+", backup_id):
+        raise ValueError("❌ Backup ids may only contain a-z, 0-9, '_' and '-'")
+    classes = index_classes(client, class_name)
+    if not classes:
+        raise ValueError(f"❌ Class '{class_name}' not found, nothing to snapshot")
+
+    metadata = read_index_metadata(client, class_name)
+    if not metadata:
+        # Indexes built before index metadata existed: describe the local files
+        print("⚠️ No index metadata stored, recording the local chunk file instead.")
+        metadata = {
+            "chunk_file": chunk_file,
+            "chunk_fingerprint": (
+                file_fingerprint(chunk_file) if os.path.exists(chunk_file) else None
+            ),
+            "model_name": MODEL_NAME,
+        }
+
+    counts = class_counts(client, classes)
+    print(f"📸 Creating snapshot {backup_id} of {', '.join(classes)}...")
+    started = time.perf_counter()
+    result = client.backup.create(
+        backup_id=backup_id,
+        backend=BACKUP_BACKEND,
+        include_classes=classes,
+        wait_for_completion=True,
+    )
+    if (result or {}).get("status") != "SUCCESS":
+        raise RuntimeError(f"❌ Snapshot {backup_id} failed: {result}")
+
+    manifest = {
+        "backup_id": backup_id,
+        "backend": BACKUP_BACKEND,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "class_name": class_name,
+        "classes": classes,
+        "object_counts": counts,
+        "chunk_file": metadata.get("chunk_file"),
+        "chunk_fingerprint": metadata.get("chunk_fingerprint"),
+        "model_name": metadata.get("model_name"),
+        "ingestion_version": metadata.get("ingestion_version"),
+        # This class's entries of the shared helper classes
+        "index_metadata": read_index_metadata(client, class_name),
+        "article_index": export_article_index(client, class_name),
+    }
+    path = _write_manifest(manifest, backup_dir)
+    _write_manifest(manifest, snapshot_dir)
+    print(
+        f"✅ Snapshot {backup_id} done in {time.perf_counter() - started:.1f}s "
+        f"({sum(counts.values())} objects). Manifest: {path}"
+    )
+    return manifest
+
+
+def list_snapshots(snapshot_dir=SNAPSHOT_DIR):
+    if not os.path.isdir(snapshot_dir):
+        return []
+    manifests = []
+    for name in os.listdir(snapshot_dir):
+        if name.endswith(".json"):
+            with open(os.path.join(snapshot_dir, name), "r", encoding="utf-8") as f:
+                manifests.append(json.load(f))
+    return sorted(manifests, key=lambda m: m.get("created_at", ""))
+
+
+def validate_snapshot(manifest, chunk_file=CHUNK_FILE, model_name=MODEL_NAME):
+    """Reasons the snapshot doesn't match this deployment (empty if it does)."""
+    problems = []
+    if manifest.get("model_name") and manifest["model_name"] != model_name:
+        problems.append(
+            f"vectors were built with {manifest['model_name']}, "
+            f"queries here use {model_name}"
+        )
+    if manifest.get("chunk_fingerprint") and os.path.exists(chunk_file):
+        if file_fingerprint(chunk_file) != manifest["chunk_fingerprint"]:
+            problems.append(f"{chunk_file} changed since the snapshot was taken")
+    return problems
+
+
+def restore_snapshot(
+    client,
+    backup_id,
+    snapshot_dir=SNAPSHOT_DIR,
+    replace=False,
+    allow_stale=False,
+    chunk_file=CHUNK_FILE,
+    backup_dir=BACKUP_DIR,
+):
+    manifest = load_manifest(backup_id, snapshot_dir, backup_dir)
+    problems = validate_snapshot(manifest, chunk_file)
+    for problem in problems:
+        print(f"⚠️ {problem}")
+    if problems and not allow_stale:
+        raise ValueError("❌ Snapshot doesn't match; pass --allow-stale to restore it")
+
+    # Older manifests listed the shared classes; never drop or restore those
+    classes = [name for name in manifest["classes"] if name not in SHARED_CLASSES]
+    existing = [name for name in classes if client.schema.exists(name)]
+    if existing:
+        if not replace:
+            raise ValueError(
+                f"❌ Classes already exist: {', '.join(existing)}. "
+                "Pass --replace to drop them first."
+            )
+        for name in existing:
+            print(f"❌ Deleting class {name}...")
+            client.schema.delete_class(name)
+
+    print(f"♻️ Restoring snapshot {backup_id} ({', '.join(classes)})...")
+    started = time.perf_counter()
+    result = client.backup.restore(
+        backup_id=backup_id,
+        backend=manifest.get("backend", BACKUP_BACKEND),
+        include_classes=classes,
+        wait_for_completion=True,
+    )
+    if (result or {}).get("status") != "SUCCESS":
+        raise RuntimeError(f"❌ Restore of {backup_id} failed: {result}")
+
+    counts = class_counts(client, classes)
+    expected = {name: manifest["object_counts"][name] for name in classes}
+    if counts != expected:
+        raise RuntimeError(
+            f"❌ Restored object counts {counts} differ from the snapshot {expected}"
+        )
+    if manifest.get("index_metadata"):
+        store_index_metadata(client, manifest["class_name"], manifest["index_metadata"])
+    if manifest.get("article_index"):
+        import_article_index_objects(client, manifest["article_index"])
+    restored = read_index_metadata(client, manifest["class_name"])
+    if (
+        manifest.get("ingestion_version")
+        and restored.get("ingestion_version") != manifest["ingestion_version"]
+    ):
+        raise RuntimeError("❌ Restored index metadata doesn't match the snapshot")
+
+    print(
+        f"✅ Restored {sum(counts.values())} objects in "
+        f"{time.perf_counter() - started:.1f}s"
+    )
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Weaviate index snapshots")
+    parser.add_argument("--weaviate-url", default=WEAVIATE_URL)
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    parser.add_argument(
+        "--backup-dir", default=BACKUP_DIR, help="host path of the backup files"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    create = sub.add_parser("create", help="back up the chunk classes")
+    create.add_argument("--backup-id")
+    create.add_argument("--class-name", default=CLASS_NAME)
+    create.add_argument("--chunk-file", default=CHUNK_FILE)
+
+    sub.add_parser("list", help="show recorded snapshots")
+
+    restore = sub.add_parser("restore", help="restore and validate a snapshot")
+    restore.add_argument("backup_id")
+    restore.add_argument("--chunk-file", default=CHUNK_FILE)
+    restore.add_argument(
+        "--replace",
+        action="store_true",
+        help="drop existing classes with the same names first",
+    )
+    restore.add_argument(
+        "--allow-stale",
+        action="store_true",
+        help="restore even if the model or chunk file differs",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        for manifest in list_snapshots(args.snapshot_dir):
+            total = sum(manifest.get("object_counts", {}).values())
+            print(
+                f"📸 {manifest['backup_id']}  {manifest['created_at']}  "
+                f"{total} objects  {manifest.get('model_name')}  "
+                f"chunks {str(manifest.get('chunk_fingerprint'))[:12]}"
+            )
+        return
+
+    client = WeaviateClient(args.weaviate_url)
+    try:
+        if args.command == "create":
+            create_snapshot(
+                client,
+                args.class_name,
+                args.backup_id,
+                args.snapshot_dir,
+                args.chunk_file,
+                args.backup_dir,
+            )
+        else:
+            restore_snapshot(
+                client,
+                args.backup_id,
+                args.snapshot_dir,
+                replace=args.replace,
+                allow_stale=args.allow_stale,
+                chunk_file=args.chunk_file,
+                backup_dir=args.backup_dir,
+            )
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    main()
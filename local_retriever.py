@@ -0,0 +1,344 @@
+"""
+In-process hybrid search over a precomputed-vector artifact.
+
+For single-node or offline deployments without Weaviate. The artifact
+written by `core_embedding.py --export-artifact` (see vector_artifact.py)
+provides the records and a memory-mapped vector matrix; this module adds:
+
+    - a FAISS inner-product index over the detail chunks' vectors (numpy if
+      faiss-cpu is missing; vectors are normalized, so inner product is
+      cosine). The retrievers' "doc_type = chunk" filter, on every plain
+      search of an artifact with summaries, is served by it unfiltered
+    - a BM25 index over `content`, with per-posting weights precomputed
+    - posting lists for the filterable properties, so the retrievers'
+      where-filters (article / stage / parameter_names / doc_type) become
+      boolean masks instead of scans
+    - relative-score fusion of both rankings with the same alpha as the
+      Weaviate hybrid query
+
+LocalHybridIndex.search() returns Weaviate-shaped hits, so the retrievers
+use it in place of a hybrid query unchanged.
+
+Usage:
+    python local_retriever.py artifacts/textile "warp denier of article 8222"
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import time
+
+import numpy as np
+
+from article_summaries import section_rank
+from filter_stats import FilterStatsBuilder
+from retrieval_utils import HYBRID_ALPHA, doc_type_filter
+from vector_artifact import RECORDS_FILE, VECTORS_FILE, ArtifactReader
+
+try:
+    import faiss
+
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+BM25_K1 = 1.2  # Weaviate's defaults
+BM25_B = 0.75
+HYBRID_CANDIDATES = 100  # per ranking, before fusion
+FILTER_PROPERTIES = ["article", "stage", "parameter_names", "doc_type", "source"]
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")  # Weaviate "word" tokenization
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def _top_n(scores, n):
+    """Indices of the n highest scores, best first."""
+    if len(scores) > n:
+        top = np.argpartition(-scores, n - 1)[:n]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _normalize(scores):
+    """Min-max scale to [0, 1], as Weaviate's relativeScoreFusion does."""
+    if not len(scores):
+        return scores
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+class LocalHybridIndex:
+    """Vector + BM25 + filter indexes over one artifact, loaded once."""
+
+    def __init__(self, path, verify=False):
+        started = time.perf_counter()
+        reader = ArtifactReader(path, verify=verify)
+        self.path = path
+        self.model_name = reader.model_name
+        self.count = reader.count
+        self.vectors = reader.vectors
+
+        self.uuids = []
+        self.records = []
+        filter_stats = FilterStatsBuilder()
+        for _, uuid, record in reader.iter_records():
+            self.uuids.append(uuid)
+            self.records.append(record)
+            filter_stats.add(record)
+
+        self.rows_by_uuid = {uuid: row for row, uuid in enumerate(self.uuids)}
+        self._build_bm25()
+        self._build_filters()
+        # Summaries are only fetched by article, never ranked; leave them out
+        self.chunk_rows = np.array(
+            [
+                row
+                for row, record in enumerate(self.records)
+                if record.get("doc_type", "chunk") == "chunk"
+            ],
+            dtype=np.int64,
+        )
+        self.faiss_index = None
+        if FAISS_AVAILABLE and len(self.chunk_rows):
+            self.faiss_index = faiss.IndexFlatIP(reader.dims)
+            self.faiss_index.add(
+                np.ascontiguousarray(self.vectors[self.chunk_rows], dtype=np.float32)
+            )
+
+        # Same shape as the Weaviate index metadata, for the retrievers
+        files = reader.manifest.get("files", {})
+        self.metadata = {
+            "ingestion_version": hashlib.sha256(
+                (files.get(RECORDS_FILE, "") + files.get(VECTORS_FILE, "")).encode()
+            ).hexdigest()[:32],
+            "model_name": self.model_name,
+            "known_articles": sorted(filter_stats.articles),
+            "filter_stats": filter_stats.to_dict(),
+            "article_index": True,  # article_chunks() works on any artifact
+        }
+        self.has_summaries = "summary" in self.filters["doc_type"]
+        print(
+            f"📂 Local index over {self.count} records from {path} "
+            f"({'faiss' if self.faiss_index else 'numpy'} vectors) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+    def _build_bm25(self):
+        doc_tokens = [tokenize(record.get("content")) for record in self.records]
+        doc_len = np.array([len(tokens) for tokens in doc_tokens], dtype=np.float32)
+        avgdl = float(doc_len.mean()) if self.count else 0.0
+
+        rows_by_term = {}
+        tf_by_term = {}
+        for row, tokens in enumerate(doc_tokens):
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                rows_by_term.setdefault(token, []).append(row)
+                tf_by_term.setdefault(token, []).append(tf)
+
+        # term -> (rows, BM25 weight of the term in each row)
+        self.postings = {}
+        for term, rows in rows_by_term.items():
+            rows = np.array(rows, dtype=np.int32)
+            tf = np.array(tf_by_term[term], dtype=np.float32)
+            idf = np.log(1 + (self.count - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[rows] / max(avgdl, 1.0))
+            self.postings[term] = (rows, idf * tf * (BM25_K1 + 1) / (tf + norm))
+
+    def _build_filters(self):
+        """property -> value -> rows having that value."""
+        values = {prop: {} for prop in FILTER_PROPERTIES}
+        for row, record in enumerate(self.records):
+            for prop in FILTER_PROPERTIES:
+                value = record.get(prop)
+                for item in value if isinstance(value, list) else [value]:
+                    if item not in (None, ""):
+                        values[prop].setdefault(item, []).append(row)
+        self.filters = {
+            prop: {
+                value: np.array(rows, dtype=np.int32) for value, rows in index.items()
+            }
+            for prop, index in values.items()
+        }
+
+    def _mask(self, where):
+        """Boolean row mask for a where-filter built by the retrievers."""
+        operator = where["operator"]
+        if operator in ("And", "Or"):
+            masks = [self._mask(operand) for operand in where["operands"]]
+            combine = np.logical_and if operator == "And" else np.logical_or
+            return combine.reduce(masks)
+        if operator not in ("Equal", "ContainsAny"):
+            raise ValueError(f"Unsupported filter operator for local search: {where}")
+
+        prop = where["path"][0]
+        if prop not in self.filters:
+            raise ValueError(f"Property '{prop}' isn't filterable locally")
+        wanted = where.get("valueText")
+        mask = np.zeros(self.count, dtype=bool)
+        for value in wanted if isinstance(wanted, list) else [wanted]:
+            rows = self.filters[prop].get(value)
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def _vector_ranking(self, query_vector, rows, n):
+        """Top rows by cosine; rows=None means every detail chunk."""
+        vector = np.asarray(query_vector, dtype=np.float32)
+        if rows is None and self.faiss_index is not None:
+            scores, found = self.faiss_index.search(vector[None, :], n)
+            keep = found[0] >= 0
+            return self.chunk_rows[found[0][keep]], scores[0][keep]
+        if rows is None:
+            # No faiss: one pass over the memmap, no copy of the matrix
+            scores = np.asarray(self.vectors @ vector)[self.chunk_rows]
+            rows = self.chunk_rows
+        else:
+            # Filtered: posting lists are small, exact dot products
+            scores = np.asarray(self.vectors[rows] @ vector)
+        top = _top_n(scores, n)
+        return rows[top], scores[top]
+
+    def _bm25_ranking(self, query, rows, n):
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        rows = self.chunk_rows if rows is None else rows
+        rows = rows[scores[rows] > 0]
+        top = _top_n(scores[rows], n)
+        return rows[top], scores[rows][top]
+
+    def _hit(self, row, score):
+        record = self.records[row]
+        hit = {key: value for key, value in record.items() if key != "metadata"}
+        hit["_additional"] = {"id": self.uuids[row], "score": f"{score:.6f}"}
+        return hit
+
+    def search(self, query, query_vector, where, limit, alpha=HYBRID_ALPHA):
+        """Hybrid search returning Weaviate-shaped hits, best first.
+
+        Without a query vector (no embedding backend) this is plain BM25.
+        """
+        if where == doc_type_filter("chunk"):
+            rows = None  # every detail chunk: the unfiltered faiss search
+        elif where:
+            rows = np.flatnonzero(self._mask(where))
+            if not len(rows):
+                return []
+        elif len(self.chunk_rows) < self.count:
+            rows = np.arange(self.count)  # summaries too, which faiss doesn't hold
+        else:
+            rows = None
+        n = max(limit, HYBRID_CANDIDATES)
+
+        if query_vector is None:
+            rankings = [(1.0, self._bm25_ranking(query, rows, n))]
+        else:
+            rankings = [
+                (1 - alpha, self._bm25_ranking(query, rows, n)),
+                (alpha, self._vector_ranking(query_vector, rows, n)),
+            ]
+        fused = {}
+        for weight, (ranked_rows, scores) in rankings:
+            for row, score in zip(ranked_rows.tolist(), _normalize(scores).tolist()):
+                fused[row] = fused.get(row, 0.0) + weight * score
+
+        best = sorted(fused.items(), key=lambda item: -item[1])[:limit]
+        return [self._hit(row, score) for row, score in best]
+
+    def article_summaries(self, articles):
+        """Summary hits of the given articles (no ranking)."""
+        if not self.has_summaries:
+            return []
+        mask = self._mask(
+            {
+                "operator": "And",
+                "operands": [
+                    {"path": ["doc_type"], "operator": "Equal", "valueText": "summary"},
+                    {
+                        "path": ["article"],
+                        "operator": "ContainsAny",
+                        "valueText": list(articles),
+                    },
+                ],
+            }
+        )
+        return [self._hit(row, 1.0) for row in np.flatnonzero(mask)]
+
+    def article_chunks(self, articles):
+        """Per article, [(chunk_id, stage, None)] in stage order."""
+        entries = []
+        for article in articles:
+            rows = [
+                row
+                for row in self.filters["article"].get(article, [])
+                if self.records[row].get("doc_type", "chunk") == "chunk"
+            ]
+            rows.sort(
+                key=lambda row: section_rank(
+                    self.records[row].get("stage")
+                    or self.records[row].get("source")
+                    or ""
+                )
+            )
+            entries.append(
+                [
+                    (self.uuids[row], self.records[row].get("stage") or "", None)
+                    for row in rows
+                ]
+            )
+        return entries
+
+    def hits_by_id(self, ids):
+        return [
+            self._hit(self.rows_by_uuid[object_id], 1.0)
+            for object_id in ids
+            if object_id in self.rows_by_uuid
+        ]
+
+    def raw_metadata(self, object_id):
+        """Full JSON metadata of a record, if the artifact stored it."""
+        row = self.rows_by_uuid.get(object_id)
+        if row is None:
+            return {}
+        raw = self.records[row].get("metadata")
+        return json.loads(raw) if raw else {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local hybrid search over an artifact")
+    parser.add_argument("path", help="artifact directory")
+    parser.add_argument("query")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--embedding-backend", default=None)
+    args = parser.parse_args(argv)
+
+    from embedding_backends import get_embedder
+
+    index = LocalHybridIndex(args.path)
+    embedder = get_embedder(args.embedding_backend, model_name=index.model_name)
+    vector = embedder.encode(args.query, normalize_embeddings=True)
+
+    started = time.perf_counter()
+    hits = index.search(args.query, vector, None, args.k)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for hit in hits:
+        print(
+            f"{hit['_additional']['score']}  {hit.get('article')} "
+            f"[{hit.get('stage') or hit.get('source')}] {hit['content'][:80]!r}"
+        )
+    print(f"⏱️ {len(hits)} hits in {elapsed_ms:.1f} ms (embedding excluded)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+In-process caches for the retrievers.
+
+EmbeddingCache: normalized query text -> query vector, so repeated questions
+(and the sidebar "Test Query") skip the embedding forward pass. The retriever
+lives in Streamlit's cached resource, so one cache serves every session.
+
+SemanticAnswerCache: answers keyed by query embedding similarity, so
+paraphrases of an answered question ("warp denier of 8222" / "what is the
+warp denier for article 8222") skip retrieval and the LLM call.
+
+PersistentRetrievalCache: optional SQLite (WAL) cache of retrieved hits that
+survives restarts and is shared by every app worker on the host. Enable it
+with RETRIEVAL_CACHE_PATH=/path/to/retrieval_cache.sqlite3.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+ANSWER_CACHE_SIZE = 512
+ANSWER_CACHE_THRESHOLD = 0.92  # cosine similarity of normalized query vectors
+ANSWER_CACHE_TTL_SECONDS = 3600
+INDEX_VERSION_REFRESH_SECONDS = 30  # how stale the cached index version may be
+RETRIEVAL_CACHE_MAX_ROWS = 50000
+RETRIEVAL_CACHE_PRUNE_EVERY = 500  # writes between size checks
+# Numbers and comparisons in a query; "gsm more than 120" and "gsm more
+# than 150" embed almost identically but must never share an answer
+QUERY_CONSTRAINT_PATTERN = re.compile(
+    r"\d+(?:\.\d+)?|[<>]=?|=|"
+    r"\b(?:more|less|greater|fewer|higher|lower) than\b|"
+    r"\b(?:at least|at most|up to|above|below|over|under|around|"
+    r"approximately|between|exactly|min(?:imum)?|max(?:imum)?)\b"
+)
+
+
+def normalize_query(query):
+    """Cache key for a query.
+
+    all-MiniLM-L6-v2 is an uncased model and its tokenizer ignores runs of
+    whitespace, so case and spacing don't change the embedding.
+    """
+    return " ".join(query.lower().split())
+
+
+class EmbeddingCache:
+    """Bounded, thread-safe LRU of query vectors with hit/miss counters."""
+
+    def __init__(self, maxsize=QUERY_EMBEDDING_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, query, compute):
+        """Cached vector for `query`, else `compute()` and remember it."""
+        key = normalize_query(query)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(vector)
+            self.misses += 1
+
+        # Encode outside the lock so concurrent sessions don't serialize
+        vector = tuple(compute())
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return list(vector)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def query_constraints(query):
+    """Numbers and comparators of `query`, in order ("more than", "120")."""
+    return tuple(QUERY_CONSTRAINT_PATTERN.findall(normalize_query(query)))
+
+
+def query_signature(query_type, processes, parameters, articles, query=""):
+    """What a cached answer must agree on besides embedding similarity.
+
+    Paraphrases may differ in wording, but never in the article, stage,
+    parameter, prompt template or the values and comparisons they ask about.
+    """
+    return (
+        query_type,
+        tuple(sorted({p.lower() for p in processes})),
+        tuple(sorted({p.lower() for p in parameters})),
+        tuple(sorted(set(articles))),
+        query_constraints(query),
+    )
+
+
+class SemanticAnswerCache:
+    """Thread-safe answer cache matched on cosine similarity + signature.
+
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted beyond `maxsize`. Everything is dropped when the index version
+    changes, since answers may cite chunks that no longer exist.
+    """
+
+    def __init__(
+        self,
+        maxsize=ANSWER_CACHE_SIZE,
+        threshold=ANSWER_CACHE_THRESHOLD,
+        ttl=ANSWER_CACHE_TTL_SECONDS,
+    ):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.index_version = None
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, index_version):
+        if index_version != self.index_version:
+            self._entries.clear()
+            self.index_version = index_version
+
+    def lookup(self, query_vector, signature, index_version=None):
+        """(answer, chunks) of the most similar cached query, or None."""
+        vector = np.asarray(query_vector, dtype=np.float32)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(index_version)
+            best_key, best_score = None, self.threshold
+            for key, entry in list(self._entries.items()):
+                if now - entry["created_at"] > self.ttl:
+                    del self._entries[key]
+                    continue
+                if entry["signature"] != signature:
+                    continue
+                score = float(np.dot(entry["vector"], vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            entry = self._entries[best_key]
+            return entry["answer"], entry["chunks"]
+
+    def store(self, query_vector, signature, answer, chunks, index_version=None):
+        with self._lock:
+            self._check_version(index_version)
+            self._entries[self._next_key] = {
+                "vector": np.asarray(query_vector, dtype=np.float32),
+                "signature": signature,
+                "answer": answer,
+                "chunks": chunks,
+                "created_at": time.monotonic(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "index_version": self.index_version,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class PersistentRetrievalCache:
+    """(filter plan, query, query vector, k) -> hits, stored in SQLite.
+
+    Hits are stored lean, as searched; the `content` loaded for them later
+    is cached per object id, so a cache hit needs no Weaviate round trip.
+
+    WAL mode lets many reader processes share the file while one writes.
+    Rows carry the ingestion version they were produced under and a lookup
+    only matches the current version. The first worker to see a version
+    records when it did; a worker switching to a version deletes the rows
+    of versions first seen before it, never newer ones. Workers refresh the
+    version on their own schedule, so during a re-ingest the ones still on
+    the old version keep their rows instead of wiping the new version's.
+    """
+
+    def __init__(self, path, max_rows=RETRIEVAL_CACHE_MAX_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._writes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS retrieval_cache ("
+                " key TEXT PRIMARY KEY,"
+                " index_version TEXT NOT NULL,"
+                " hits TEXT NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS retrieval_cache_last_used"
+                " ON retrieval_cache (last_used)"
+            )
+            # At most one row per indexed object and live version
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS retrieval_cache_content ("
+                " object_id TEXT NOT NULL,"
+                " index_version TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " PRIMARY KEY (object_id, index_version))"
+            )
+            # Kept for every version, so a late worker can't re-date an old one
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS retrieval_cache_versions ("
+                " index_version TEXT PRIMARY KEY,"
+                " first_seen REAL NOT NULL)"
+            )
+
+    @classmethod
+    def from_env(cls):
+        """Cache at $RETRIEVAL_CACHE_PATH, or None when it isn't set."""
+        path = os.getenv("RETRIEVAL_CACHE_PATH")
+        return cls(path) if path else None
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(plan, query, query_vector, k):
+        vector_hash = hashlib.sha256(
+            np.asarray(query_vector, dtype=np.float32).tobytes()
+        ).hexdigest()
+        payload = json.dumps(
+            [plan, normalize_query(query), vector_hash, k], sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _check_version(self, conn, index_version):
+        with self._lock:
+            if index_version == self._version:
+                return
+            self._version = index_version
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO retrieval_cache_versions VALUES (?, ?)",
+                (index_version, time.time()),
+            )
+            for table in ("retrieval_cache", "retrieval_cache_content"):
+                conn.execute(
+                    f"DELETE FROM {table} WHERE index_version IN ("
+                    " SELECT index_version FROM retrieval_cache_versions"
+                    " WHERE first_seen < (SELECT first_seen"
+                    " FROM retrieval_cache_versions WHERE index_version = ?))",
+                    (index_version,),
+                )
+
+    def get(self, plan, query, query_vector, k, index_version):
+        """Cached hits (possibly an empty list), or None on a miss."""
+        conn = self._connection()
+        self._check_version(conn, index_version)
+        key = self.make_key(plan, query, query_vector, k)
+        row = conn.execute(
+            "SELECT hits FROM retrieval_cache WHERE key = ? AND index_version = ?",
+            (key, index_version),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with conn:
+            conn.execute(
+                "UPDATE retrieval_cache SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        return json.loads(row[0])
+
+    def put(self, plan, query, query_vector, k, index_version, hits):
+        conn = self._connection()
+        key = self.make_key(plan, query, query_vector, k)
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO retrieval_cache VALUES (?, ?, ?, ?)",
+                (key, index_version, json.dumps(hits), time.time()),
+            )
+        self._writes += 1
+        if self._writes % RETRIEVAL_CACHE_PRUNE_EVERY == 0:
+            self.prune(conn)
+
+    def get_content(self, object_ids, index_version):
+        """{object id: content} of the ids cached under `index_version`."""
+        if not object_ids:
+            return {}
+        conn = self._connection()
+        self._check_version(conn, index_version)
+        placeholders = ", ".join("?" * len(object_ids))
+        rows = conn.execute(
+            "SELECT object_id, content FROM retrieval_cache_content"
+            f" WHERE index_version = ? AND object_id IN ({placeholders})",
+            (index_version, *object_ids),
+        ).fetchall()
+        return dict(rows)
+
+    def put_content(self, contents, index_version):
+        """Store {object id: content} loaded under `index_version`."""
+        if not contents:
+            return
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO retrieval_cache_content VALUES (?, ?, ?)",
+                [
+                    (object_id, index_version, content)
+                    for object_id, content in contents.items()
+                ],
+            )
+
+    def prune(self, conn=None):
+        """Drop the least recently used rows beyond `max_rows`."""
+        conn = conn or self._connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM retrieval_cache WHERE key IN ("
+                " SELECT key FROM retrieval_cache ORDER BY last_used DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self.max_rows,),
+            )
+
+    def stats(self):
+        rows = (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM retrieval_cache")
+            .fetchone()[0]
+        )
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "rows": rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "index_version": self._version,
+        }
@@ -0,0 +1,355 @@
+"""
+Helpers shared by the Weaviate retrievers in core_chatbot.py and core_ui.py.
+"""
+
+import json
+import math
+import re
+
+# Metadata promoted to typed schema properties by core_embedding
+TYPED_METADATA_FIELDS = ["source", "sheet", "full_article", "machine", "fibres"]
+RESULT_PROPERTIES = ["content", "article", "stage"] + TYPED_METADATA_FIELDS
+LEGACY_RESULT_PROPERTIES = ["content", "metadata"]
+# Only present on newer indexes (article summaries, token counts)
+OPTIONAL_RESULT_PROPERTIES = ["doc_type", "token_count"]
+
+HYBRID_ALPHA = 0.5  # vector weight in hybrid fusion (1 - alpha goes to BM25)
+
+# Per-source partitions (core_embedding.py --partition-by-source)
+PARTITION_SEPARATOR = "_"
+MIN_SOURCE_LIMIT = 5
+RRF_K = 60  # rank constant from the original reciprocal-rank-fusion paper
+
+# Run the unfiltered fallback query alongside the filtered one instead of
+# after it, so an empty filter costs one round-trip instead of two
+CONCURRENT_FALLBACK = True
+FALLBACK_WORKERS = 4  # concurrent queries across sessions
+
+# Article numbers in queries
+ARTICLE_NUMBER_PATTERN = re.compile(r"\b\d{4,6}\b")
+EXPLICIT_ARTICLE_PATTERN = re.compile(r"article\s+(\d{4,6})\b")
+APPROXIMATE_NUMBER_PATTERN = re.compile(
+    r"(?:around|close to|less than|greater than|near to|more than)\s+(\d{4,6})\b"
+)
+
+
+def extract_article_numbers(query_lower, known_articles=None):
+    """Article numbers mentioned in a lowercased query.
+
+    A 4-6 digit number counts unless it follows "around", "less than", ...
+    (then it is a value) and isn't spelled "article N". With
+    `known_articles` (written by ingestion into the index metadata) only
+    numbers of real articles are kept, so "1500 tokens" or "2024" never
+    become filters that match nothing.
+    """
+    explicit = set(EXPLICIT_ARTICLE_PATTERN.findall(query_lower))
+    approximate = set(APPROXIMATE_NUMBER_PATTERN.findall(query_lower))
+    articles = {
+        number
+        for number in ARTICLE_NUMBER_PATTERN.findall(query_lower)
+        if number in explicit or number not in approximate
+    }
+    if known_articles is not None:
+        articles &= known_articles
+    return list(articles)
+
+
+def search_with_fallback(executor, search, where_filter):
+    """(hits, filtered): filtered hits, or unfiltered ones if those are empty.
+
+    `search(where)` runs one query. With an executor the unfiltered query is
+    sent concurrently with the filtered one; without, it only runs after the
+    filtered query came back empty.
+    """
+    if not where_filter:
+        return search(None), False
+    if executor is None:
+        hits = search(where_filter)
+        return (hits, True) if hits else (search(None), False)
+
+    unfiltered = executor.submit(search, None)
+    hits = search(where_filter)
+    if hits:
+        unfiltered.cancel()  # no-op if already running; its result is dropped
+        return hits, True
+    return unfiltered.result(), False
+
+
+def class_property_names(client, class_name):
+    """Property names of a class, or an empty set if it doesn't exist."""
+    try:
+        schema = client.schema.get(class_name)
+    except Exception:
+        return set()
+    return {prop["name"] for prop in schema.get("properties", [])}
+
+
+def source_class_name(class_name, source):
+    """Class holding one metadata source, e.g. TextileChunk_Route."""
+    label = "".join(ch for ch in str(source or "") if ch.isalnum()) or "Unknown"
+    return f"{class_name}{PARTITION_SEPARATOR}{label[:1].upper()}{label[1:]}"
+
+
+def source_partitions(client, class_name):
+    """Per-source classes of a partitioned index (empty if not partitioned)."""
+    prefix = f"{class_name}{PARTITION_SEPARATOR}"
+    schema = client.schema.get()
+    return sorted(
+        cls["class"]
+        for cls in schema.get("classes", [])
+        if cls["class"].startswith(prefix)
+    )
+
+
+def relevant_partitions(partitions, query):
+    """Partitions whose source the query names ("BOM of 8222"), else all."""
+    words = set(re.findall(r"\w+", query.lower()))
+    named = [
+        name
+        for name in partitions
+        if name.rsplit(PARTITION_SEPARATOR, 1)[-1].lower() in words
+    ]
+    return named or list(partitions)
+
+
+def source_limit(k, num_sources):
+    """Equal share of k per source, so one large source can't crowd out the rest."""
+    return max(MIN_SOURCE_LIMIT, math.ceil(k / max(num_sources, 1)))
+
+
+def reciprocal_rank_fusion(ranked_lists, limit, rrf_k=RRF_K):
+    """Merge ranked hit lists by summed 1 / (rrf_k + rank), keyed on object id."""
+    scores = {}
+    hits = {}
+    for ranked in ranked_lists:
+        for rank, hit in enumerate(ranked, start=1):
+            key = (hit.get("_additional") or {}).get("id") or id(hit)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            hits.setdefault(key, hit)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [hits[key] for key in ordered[:limit]]
+
+
+def hybrid_query(client, class_name, properties, query, query_vector, where, limit):
+    """Hybrid (BM25 + vector) query against one class; returns the raw hits."""
+    query_obj = client.query.get(class_name, properties)
+    if where:
+        query_obj = query_obj.with_where(where)
+    response = (
+        query_obj.with_hybrid(query=query, vector=query_vector, alpha=HYBRID_ALPHA)
+        .with_additional(["id", "score"])
+        .with_limit(limit)
+        .do()
+    )
+    return response.get("data", {}).get("Get", {}).get(class_name) or []
+
+
+def and_filter(where, clause):
+    """`where` AND `clause` (either may be None)."""
+    if not where:
+        return clause
+    if not clause:
+        return where
+    return {"operator": "And", "operands": [where, clause]}
+
+
+def doc_type_filter(doc_type):
+    return {"path": ["doc_type"], "operator": "Equal", "valueText": doc_type}
+
+
+def article_filter(articles):
+    return {
+        "operator": "Or",
+        "operands": [
+            {"path": ["article"], "operator": "Equal", "valueText": article}
+            for article in articles
+        ],
+    }
+
+
+def fetch_article_summaries(client, class_name, properties, articles):
+    """Summary documents of the given articles (plain filtered Get, no vector)."""
+    where = and_filter(article_filter(articles), doc_type_filter("summary"))
+    response = (
+        client.query.get(class_name, properties)
+        .with_where(where)
+        .with_additional(["id"])
+        .with_limit(len(articles))
+        .do()
+    )
+    hits = response.get("data", {}).get("Get", {}).get(class_name) or []
+    for hit in hits:
+        hit["_class"] = class_name
+    return hits
+
+
+def fetch_objects_by_id(client, class_name, properties, ids):
+    """Objects of one class by id (a single filtered Get), in `ids` order."""
+    if not ids:
+        return []
+    response = (
+        client.query.get(class_name, properties)
+        .with_where({"path": ["id"], "operator": "ContainsAny", "valueText": ids})
+        .with_additional(["id"])
+        .with_limit(len(ids))
+        .do()
+    )
+    hits = response.get("data", {}).get("Get", {}).get(class_name) or []
+    by_id = {hit["_additional"]["id"]: hit for hit in hits}
+    return [by_id[object_id] for object_id in ids if object_id in by_id]
+
+
+def lean_properties(properties):
+    """`properties` without `content`, or None if hits can't be hydrated later.
+
+    Needs token_count (so context can be budgeted without the text) and
+    typed metadata (the legacy JSON blob is as heavy as the content).
+    """
+    if "token_count" not in properties or "metadata" in properties:
+        return None
+    return [prop for prop in properties if prop != "content"]
+
+
+def load_hit_content(client, class_name, hits):
+    """Fill in `content` of lean hits with one Get per class, in place."""
+    ids_by_class = {}
+    for hit in hits:
+        if "content" not in hit:
+            owner = hit.get("_class", class_name)
+            ids_by_class.setdefault(owner, []).append(hit["_additional"]["id"])
+    content = {}
+    for owner, ids in ids_by_class.items():
+        for obj in fetch_objects_by_id(client, owner, ["content"], ids):
+            content[obj["_additional"]["id"]] = obj.get("content", "")
+    for hit in hits:
+        if "content" not in hit:
+            hit["content"] = content.get(hit["_additional"]["id"], "")
+    return hits
+
+
+# Words that don't narrow down an article question ("show me article 8222")
+ARTICLE_LOOKUP_STOPWORDS = frozenset(
+    "a all an and any article articles art at details detail data for from full "
+    "get give in info information list me no number of on please records show "
+    "stage stages tell the what whole".split()
+)
+
+
+def is_article_only_query(query_lower, processes, articles):
+    """Nothing in the query but article numbers, stage names and filler.
+
+    Anything else ("vendor", "fibre", "compare ... vs ...") needs ranking.
+    """
+    if not articles:
+        return False
+    ignored = set(articles) | ARTICLE_LOOKUP_STOPWORDS
+    for process in processes:
+        ignored.update(process.lower().split())
+    return all(token in ignored for token in re.findall(r"[a-z0-9]+", query_lower))
+
+
+def interleave(groups, limit):
+    """Round-robin over the groups, so each gets its share of `limit`."""
+    merged = []
+    for position in range(max((len(group) for group in groups), default=0)):
+        for group in groups:
+            if position < len(group):
+                merged.append(group[position])
+                if len(merged) >= limit:
+                    return merged
+    return merged
+
+
+def fetch_article_chunks(client, properties, entries, partitioned):
+    """Hits for article-index entries [(chunk_id, stage, class)], in order."""
+    ids_by_class = {}
+    for chunk_id, _, class_name in entries:
+        ids_by_class.setdefault(class_name, []).append(chunk_id)
+    by_id = {}
+    for class_name, ids in ids_by_class.items():
+        for hit in fetch_objects_by_id(client, class_name, properties, ids):
+            if partitioned:
+                hit["_class"] = class_name
+            by_id[hit["_additional"]["id"]] = hit
+    return [by_id[chunk_id] for chunk_id, _, _ in entries if chunk_id in by_id]
+
+
+def partitioned_hybrid_query(
+    client, executor, partitions, properties, query, query_vector, where, k
+):
+    """Query the relevant source partitions concurrently and fuse them with RRF.
+
+    Each hit is tagged with `_class` so its full object can be fetched later.
+    """
+    targets = relevant_partitions(partitions, query)
+    limit = source_limit(k, len(targets))
+
+    def run(class_name):
+        hits = hybrid_query(
+            client, class_name, properties, query, query_vector, where, limit
+        )
+        for hit in hits:
+            hit["_class"] = class_name
+        return hits
+
+    return reciprocal_rank_fusion(list(executor.map(run, targets)), k)
+
+
+def result_properties(client, class_name):
+    """Properties to request per hit.
+
+    Indexes built before the typed properties existed only have the JSON
+    `metadata` blob, so fall back to fetching that.
+    """
+    available = class_property_names(client, class_name)
+    if set(RESULT_PROPERTIES) <= available:
+        return list(RESULT_PROPERTIES) + [
+            name for name in OPTIONAL_RESULT_PROPERTIES if name in available
+        ]
+    return list(LEGACY_RESULT_PROPERTIES)
+
+
+def parse_raw_metadata(raw):
+    if not isinstance(raw, str):
+        return raw or {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return {"raw": raw}
+
+
+def hit_metadata(hit):
+    """Document metadata for a hit: typed fields plus the object id."""
+    if "metadata" in hit:
+        meta = parse_raw_metadata(hit.get("metadata"))
+    else:
+        meta = {
+            key: value
+            for key, value in hit.items()
+            if key not in ("content", "_additional", "_class")
+            and value not in (None, "", [])
+        }
+    additional = hit.get("_additional") or {}
+    if additional.get("id"):
+        meta["_id"] = additional["id"]
+    if additional.get("score") is not None:
+        meta["_score"] = float(additional["score"])
+    if hit.get("_class"):
+        # Set by the retrievers when the hit came from a per-source partition
+        meta["_class"] = hit["_class"]
+    return meta
+
+
+def load_raw_metadata(client, class_name, metadata):
+    """Fetch and parse the full JSON metadata of a retrieved hit on demand.
+
+    `metadata` is the hit's Document metadata (see hit_metadata); {} if the
+    index was built without the raw JSON.
+    """
+    object_id = metadata.get("_id")
+    if not object_id:
+        return metadata
+    class_name = metadata.get("_class", class_name)
+    obj = client.data_object.get_by_id(object_id, class_name=class_name)
+    raw = ((obj or {}).get("properties") or {}).get("metadata")
+    return parse_raw_metadata(raw) if raw else {}
@@ -0,0 +1,120 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("weaviate")
+pytest.importorskip("tqdm")
+
+from core_embedding import BatchImporter, replay_journal  # noqa: E402
+
+
+class FlakyBatch:
+    """Stands in for client.batch: rejects uuids in `failures` that many times.
+
+    Uuids in `drop` are never acknowledged, like objects of a failed request.
+    """
+
+    def __init__(self, failures=None, drop=(), broken=False):
+        self.failures = dict(failures or {})
+        self.drop = set(drop)
+        self.broken = broken
+        self.stored = {}
+        self.callback = None
+        self.buffer = []
+
+    def configure(self, callback=None, **kwargs):
+        self.callback = callback
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.buffer = []
+
+    def add_data_object(self, data_object, class_name, vector=None, uuid=None):
+        if self.broken:
+            raise ConnectionError("weaviate is down")
+        self.buffer.append((uuid, class_name, data_object))
+
+    def flush(self):
+        results = []
+        for uuid, class_name, data_object in self.buffer:
+            if uuid in self.drop:
+                continue
+            if self.failures.get(uuid, 0) > 0:
+                self.failures[uuid] -= 1
+                error = {"error": [{"message": "boom"}]}
+                results.append({"id": uuid, "result": {"errors": error}})
+            else:
+                self.stored[uuid] = (class_name, data_object)
+                results.append({"id": uuid, "result": {}})
+        self.buffer = []
+        if results:
+            self.callback(results)
+
+
+class FakeClient:
+    def __init__(self, batch):
+        self.batch = batch
+
+
+def _import(batch, journal_file, max_retries=2):
+    importer = BatchImporter(
+        FakeClient(batch),
+        class_name="TextileChunk",
+        max_retries=max_retries,
+        backoff=0,
+        journal_file=str(journal_file),
+    )
+    with importer:
+        for uuid in ("a", "b", "c"):
+            importer.add({"content": uuid}, [0.5, 0.5], uuid)
+    return importer
+
+
+def _journal(journal_file):
+    with open(journal_file, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_rejected_objects_are_retried_until_they_succeed(tmp_path):
+    journal_file = tmp_path / "failed.jsonl"
+    batch = FlakyBatch(failures={"b": 2})
+
+    importer = _import(batch, journal_file, max_retries=3)
+
+    assert sorted(batch.stored) == ["a", "b", "c"]
+    assert (importer.imported, importer.retried, importer.journaled) == (3, 2, 0)
+    assert not journal_file.exists()
+
+
+def test_objects_still_failing_after_the_retries_are_journaled(tmp_path):
+    journal_file = tmp_path / "failed.jsonl"
+    batch = FlakyBatch(failures={"b": 99}, drop={"c"})
+
+    importer = _import(batch, journal_file)
+
+    assert sorted(batch.stored) == ["a"]
+    assert (importer.imported, importer.journaled) == (1, 2)
+    entries = {entry["uuid"]: entry for entry in _journal(journal_file)}
+    assert sorted(entries) == ["b", "c"]
+    assert entries["b"]["class_name"] == "TextileChunk"
+    assert entries["b"]["data_object"] == {"content": "b"}
+    assert entries["b"]["vector"] == [0.5, 0.5]
+    assert entries["c"]["errors"] == {"error": "not acknowledged"}
+
+
+def test_an_interrupted_replay_keeps_the_journal(tmp_path):
+    journal_file = tmp_path / "failed.jsonl"
+    _import(FlakyBatch(failures={"b": 99}, drop={"c"}), journal_file)
+
+    with pytest.raises(ConnectionError):
+        replay_journal(FakeClient(FlakyBatch(broken=True)), str(journal_file))
+    assert os.path.exists(f"{journal_file}.replaying")
+
+    batch = FlakyBatch()
+    replay_journal(FakeClient(batch), str(journal_file))
+    assert sorted(batch.stored) == ["b", "c"]
+    assert os.listdir(tmp_path) == []
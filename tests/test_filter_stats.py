@@ -0,0 +1,73 @@
+from filter_stats import FilterPlanner, FilterStatsBuilder
+
+
+def _planner():
+    builder = FilterStatsBuilder()
+    chunks = (
+        [("8222", "warping", ["warping speed"])] * 6
+        + [("8222", "beaming", ["beam tension"])] * 2
+        + [("8090", "beaming", ["warping speed"])]
+    )
+    for article, stage, parameters in chunks:
+        builder.add({"article": article, "stage": stage, "parameter_names": parameters})
+    # Summaries are no filter targets
+    builder.add({"article": "8222", "stage": "", "doc_type": "summary"})
+    planner = FilterPlanner()
+    planner.update(builder.to_dict(), "v1")
+    return planner
+
+
+def test_clauses_without_chunks_are_dropped():
+    processes, parameters, articles, k, notes = _planner().plan(
+        ["Warping", "Sizing"], [], ["8222", "9999"], 30
+    )
+
+    assert (processes, parameters, articles) == (["Warping"], [], ["8222"])
+    assert k == 6  # 8 chunks of 8222, 6 of them warping
+    assert notes == ["no chunks for article ['9999']", "no chunks for stage ['Sizing']"]
+
+
+def test_a_stage_rarely_seen_with_the_parameters_is_relaxed():
+    processes, parameters, _, k, notes = _planner().plan(
+        ["beaming"], ["Warping Speed"], [], 30
+    )
+
+    assert (processes, parameters) == ([], ["Warping Speed"])
+    assert k == 7  # every chunk with the parameter
+    assert notes == ["relaxed stage ['beaming']: 1 chunks with both"]
+
+
+def test_k_is_bounded_by_the_candidates_the_filter_can_return():
+    planner = _planner()
+
+    assert planner.plan(["warping"], ["warping speed"], [], 30)[:4] == (
+        ["warping"],
+        ["warping speed"],
+        [],
+        6,
+    )
+    assert planner.plan([], [], ["8090"], 30)[3] == 1
+    assert planner.plan([], ["warping speed"], [], 3)[3] == 3
+
+
+def test_without_statistics_plans_pass_through():
+    assert FilterPlanner().plan(["sizing"], ["gsm"], ["9999"], 30) == (
+        ["sizing"],
+        ["gsm"],
+        ["9999"],
+        30,
+        [],
+    )
+
+
+def test_only_filters_the_counts_prove_skip_the_fallback():
+    planner = _planner()
+
+    assert planner.is_known_nonempty(["beaming"], [], [])
+    assert planner.is_known_nonempty([], ["beam tension"], [])
+    assert planner.is_known_nonempty(["beaming"], ["beam tension"], [])
+    assert not planner.is_known_nonempty(["warping"], ["beam tension"], [])
+    assert not planner.is_known_nonempty(["sizing"], [], [])
+    # No article x stage counts: can't be proven
+    assert not planner.is_known_nonempty(["warping"], [], ["8222"])
+    assert not FilterPlanner().is_known_nonempty([], ["gsm"], [])
@@ -0,0 +1,76 @@
+import numpy as np
+
+from local_retriever import LocalHybridIndex
+from retrieval_utils import and_filter, article_filter, doc_type_filter
+from vector_artifact import ArtifactWriter
+
+DIMS = 8
+
+
+class SpyIndex:
+    """Stands in for the faiss index (faiss-cpu is optional) and counts calls."""
+
+    def __init__(self, vectors):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.calls = 0
+
+    def search(self, queries, n):
+        self.calls += 1
+        scores = queries @ self.vectors.T
+        top = np.argsort(-scores, axis=1)[:, :n]
+        return np.take_along_axis(scores, top, axis=1), top
+
+
+def _unit(rng):
+    vector = rng.normal(size=DIMS).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _build_index(tmp_path):
+    rng = np.random.default_rng(0)
+    writer = ArtifactWriter(str(tmp_path), "test-model")
+    for i in range(40):
+        article = "8222" if i % 2 else "8090"
+        record = {
+            "content": f"warping speed {i} for article {article}",
+            "article": article,
+            "stage": "warping",
+            "parameter_names": ["warping speed"],
+            "doc_type": "chunk",
+        }
+        writer.add(f"chunk-{i}", record, _unit(rng))
+    for article in ("8222", "8090"):
+        record = {
+            "content": f"Summary of article {article}: warping speed",
+            "article": article,
+            "stage": "",
+            "parameter_names": ["warping speed"],
+            "doc_type": "summary",
+        }
+        writer.add(f"summary-{article}", record, _unit(rng))
+    writer.close()
+    index = LocalHybridIndex(str(tmp_path))
+    index.faiss_index = SpyIndex(index.vectors[index.chunk_rows])
+    return index, rng
+
+
+def test_plain_chunk_query_uses_the_faiss_index(tmp_path):
+    index, rng = _build_index(tmp_path)
+    query_vector = _unit(rng)
+
+    hits = index.search("warping speed", query_vector, doc_type_filter("chunk"), 5)
+
+    assert index.faiss_index.calls == 1
+    assert len(hits) == 5
+    assert all(hit["doc_type"] == "chunk" for hit in hits)
+
+
+def test_narrow_filters_use_exact_scores_over_their_rows(tmp_path):
+    index, rng = _build_index(tmp_path)
+    where = and_filter(article_filter(["8222"]), doc_type_filter("chunk"))
+
+    hits = index.search("warping speed", _unit(rng), where, 5)
+
+    assert index.faiss_index.calls == 0
+    assert {hit["article"] for hit in hits} == {"8222"}
+    assert all(hit["doc_type"] == "chunk" for hit in hits)
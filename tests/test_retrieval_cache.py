@@ -0,0 +1,92 @@
+import numpy as np
+
+from retrieval_cache import (
+    PersistentRetrievalCache,
+    SemanticAnswerCache,
+    query_constraints,
+    query_signature,
+)
+
+
+def _signature(query):
+    # What the retrievers extract from both queries below
+    return query_signature("quality", [], ["gsm"], [], query=query)
+
+
+def test_queries_differing_only_in_a_value_miss_each_other():
+    cache = SemanticAnswerCache()
+    vector = np.ones(4, dtype=np.float32) / 2  # identical embeddings
+    cache.store(vector, _signature("gsm more than 120"), "answer 120", [], "v1")
+
+    assert cache.lookup(vector, _signature("gsm more than 150"), "v1") is None
+    assert cache.lookup(vector, _signature("gsm less than 120"), "v1") is None
+    assert cache.lookup(vector, _signature("GSM  more than 120"), "v1") == (
+        "answer 120",
+        [],
+    )
+
+
+def test_query_constraints_keep_numbers_and_comparators_in_order():
+    assert query_constraints("warp denier >= 75") == (">=", "75")
+    assert query_constraints("GSM between 100 and 150.5") == (
+        "between",
+        "100",
+        "150.5",
+    )
+    assert query_constraints("give me an overview of the process") == ()
+
+
+def test_loaded_content_is_cached_per_object_and_version(tmp_path):
+    cache = PersistentRetrievalCache(str(tmp_path / "cache.sqlite"))
+    cache.put_content({"id-1": "warping speed 600"}, "v1")
+
+    assert cache.get_content(["id-1", "id-2"], "v1") == {"id-1": "warping speed 600"}
+    assert cache.get_content(["id-1"], "v2") == {}
+    # Switching to v2 dropped the v1 rows
+    assert cache.get_content(["id-1"], "v1") == {}
+
+
+def _workers(tmp_path, monkeypatch, count):
+    # Strictly increasing clock, so versions are never first seen at the same time
+    clock = iter(range(1, 1000))
+    monkeypatch.setattr("retrieval_cache.time.time", lambda: float(next(clock)))
+    path = str(tmp_path / "cache.sqlite")
+    return [PersistentRetrievalCache(path) for _ in range(count)]
+
+
+def _put(cache, query, version):
+    cache.put({}, query, [1.0, 0.0], 5, version, [{"content": query}])
+
+
+def _get(cache, query, version):
+    return cache.get({}, query, [1.0, 0.0], 5, version)
+
+
+def test_switching_to_a_newer_version_drops_older_rows(tmp_path, monkeypatch):
+    old_worker, new_worker = _workers(tmp_path, monkeypatch, 2)
+    _put(old_worker, "warping speed", "v1")
+
+    assert _get(new_worker, "warping speed", "v2") is None
+    _put(new_worker, "warping speed", "v2")
+    assert _get(new_worker, "warping speed", "v1") is None
+
+
+def test_a_worker_on_the_old_version_keeps_the_new_rows(tmp_path, monkeypatch):
+    old_worker, new_worker = _workers(tmp_path, monkeypatch, 2)
+    _get(old_worker, "warping speed", "v1")
+    _put(new_worker, "beaming speed", "v2")
+
+    # Still on v1: its rows stay usable and v2's rows survive its writes
+    _put(old_worker, "warping speed", "v1")
+    assert _get(old_worker, "warping speed", "v1") == [{"content": "warping speed"}]
+    assert _get(new_worker, "beaming speed", "v2") == [{"content": "beaming speed"}]
+
+
+def test_a_late_worker_cant_redate_an_old_version(tmp_path, monkeypatch):
+    first, second, late = _workers(tmp_path, monkeypatch, 3)
+    _get(first, "warping speed", "v1")
+    _put(second, "beaming speed", "v2")
+
+    # First sight of v1 for this worker, but v1 still predates v2
+    assert _get(late, "warping speed", "v1") is None
+    assert _get(second, "beaming speed", "v2") == [{"content": "beaming speed"}]
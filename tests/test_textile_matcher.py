@@ -0,0 +1,47 @@
+import random
+import re
+
+from textile_matcher import VocabularyMatcher
+
+# Prefixes of each other, punctuation and spaces: where a single-regex
+# scan can diverge from testing every term on its own
+PARAMETERS = [
+    "temp",
+    "temp.",
+    "temperature",
+    "speed",
+    "machine speed",
+    "speed (m/min)",
+    "tension",
+    "dry tension",
+    "dry tension fast",
+    "gsm",
+    "speed",  # repeated, as in the real parameter lists
+]
+PROCESS_NAMES = ["dry", "dry print", "drying", "printing", "print", "warping"]
+FILLER = ["x", ".", "-", "(", ")", " ", "a1", "m/min", "fast"]
+
+
+def _texts(vocabulary, count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        words = rng.choices(vocabulary + FILLER, k=rng.randint(1, 10))
+        yield rng.choice([" ", "", "-", "."]).join(words)
+
+
+def test_find_all_equals_the_per_term_search():
+    matcher = VocabularyMatcher(PARAMETERS)
+    for text in _texts(PARAMETERS, 2000, seed=1):
+        expected = [
+            term
+            for term in dict.fromkeys(PARAMETERS)
+            if re.search(rf"\b{re.escape(term)}\b", text)
+        ]
+        assert matcher.find_all(text) == expected, text
+
+
+def test_find_first_equals_the_substring_scan():
+    matcher = VocabularyMatcher(PROCESS_NAMES, whole_word=False)
+    for text in _texts(PROCESS_NAMES, 2000, seed=2):
+        expected = next((name for name in PROCESS_NAMES if name in text), None)
+        assert matcher.find_first(text) == expected, text
@@ -0,0 +1,132 @@
+"""
+Precompiled matchers for the textile stage / parameter vocabularies.
+
+Each vocabulary is compiled once into a single trie-shaped regex, so finding
+every term in a text is one scan instead of one `re.search` per term.
+Matchers expect text that is already lowercased.
+
+StageParameterMatcher tags chunk content at ingest; EntityMatcher pulls
+stages and parameters out of user queries.
+"""
+
+import re
+
+
+def _trie_regex(terms):
+    """Build a regex alternation shaped like a trie, longest branch first."""
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        branches = [
+            re.escape(ch) + build(child)
+            for ch, child in sorted(node.items())
+            if ch != ""
+        ]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if "" in node else body
+
+    return build(trie)
+
+
+class VocabularyMatcher:
+    """Finds every term of a fixed vocabulary that occurs in a text.
+
+    With `whole_word=True` a term counts only where `\\bterm\\b` matches,
+    exactly like `re.search(rf"\\b{re.escape(term)}\\b", text)`; otherwise it
+    is a plain substring test. Results come back in vocabulary order.
+    """
+
+    def __init__(self, terms, whole_word=True):
+        self.terms = [t for t in dict.fromkeys(terms) if t]
+        self.whole_word = whole_word
+        self._order = {term: i for i, term in enumerate(self.terms)}
+
+        boundary = r"\b" if whole_word else ""
+        trie = _trie_regex(self.terms) if self.terms else r"(?!)"
+        # Zero-width lookahead so overlapping hits at every position are seen
+        self._scanner = re.compile(rf"(?={boundary}({trie}){boundary})")
+        self._term_patterns = {
+            term: re.compile(rf"{boundary}{re.escape(term)}{boundary}")
+            for term in self.terms
+        }
+        # Terms that are a prefix of another term can hide behind the longer hit
+        self._prefixes = {
+            term: [other for other in self.terms if term.startswith(other)]
+            for term in self.terms
+        }
+
+    def find_all(self, text):
+        found = set()
+        for match in self._scanner.finditer(text):
+            longest = match.group(1)
+            start = match.start()
+            for term in self._prefixes[longest]:
+                if term in found:
+                    continue
+                if term == longest or self._term_patterns[term].match(text, start):
+                    found.add(term)
+        return sorted(found, key=self._order.__getitem__)
+
+    def find_first(self, text):
+        hits = self.find_all(text)
+        return hits[0] if hits else None
+
+
+class StageParameterMatcher:
+    """Stage detection and per-stage parameter extraction for chunk content."""
+
+    def __init__(self, process_names, process_parameters):
+        self.stage_matcher = VocabularyMatcher(process_names, whole_word=False)
+        self.parameter_matchers = {
+            stage: VocabularyMatcher(params)
+            for stage, params in process_parameters.items()
+        }
+
+    def detect_stage(self, content_lower):
+        """First process name (in vocabulary order) contained in the content."""
+        return self.stage_matcher.find_first(content_lower)
+
+    def extract_parameters(self, content_lower, stage):
+        matcher = self.parameter_matchers.get(stage)
+        return matcher.find_all(content_lower) if matcher else []
+
+
+class EntityMatcher:
+    """Finds terms of several vocabularies in a query in one left-to-right pass.
+
+    Matching is case-insensitive, bounded by non-word characters (so "temp"
+    doesn't fire inside "temperature", while "temp." still matches) and
+    leftmost-longest: "dry tension fast" is one parameter, not also the stage
+    "dry". Terms are deduplicated across vocabularies and reported with their
+    first spelling, in the order they appear in the text.
+    """
+
+    def __init__(self, vocabularies):
+        self.kinds = list(vocabularies)
+        # lowercased term -> {kind: spelling}
+        self._terms = {}
+        for kind, terms in vocabularies.items():
+            for term in terms:
+                key = term.lower()
+                if key:
+                    self._terms.setdefault(key, {}).setdefault(kind, term)
+
+        trie = _trie_regex(self._terms) if self._terms else r"(?!)"
+        self._scanner = re.compile(rf"(?<!\w)(?:{trie})(?!\w)")
+
+    def match(self, text):
+        """{kind: [terms found]} for every vocabulary."""
+        found = {kind: {} for kind in self.kinds}
+        for match in self._scanner.finditer(text.lower()):
+            for kind, term in self._terms[match.group(0)].items():
+                found[kind][term] = None
+        return {kind: list(terms) for kind, terms in found.items()}
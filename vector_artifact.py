@@ -0,0 +1,270 @@
+"""
+Portable precomputed-vector artifact.
+
+An artifact is a directory written by `core_embedding.py --export-artifact`:
+
+    manifest.json   model name, dims, count, schema settings, sha256 checksums
+    records.jsonl   one {"uuid", "data_object"} per line, in vector order
+    vectors.f32     row-major little-endian float32 matrix [count, dims],
+                    memory-mappable with numpy
+
+Importing an artifact needs no embedding model at all, so standing up a new
+Weaviate (staging, another plant, a laptop) is bound by I/O, not encoding.
+
+Usage:
+    python vector_artifact.py verify artifacts/textile
+    python vector_artifact.py import artifacts/textile [--class-name X]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+RECORDS_FILE = "records.jsonl"
+VECTORS_FILE = "vectors.f32"
+VECTOR_DTYPE = "<f4"
+
+
+def _sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class ArtifactWriter:
+    """Streams records and vectors to disk; the manifest is written on close.
+
+    An interrupted export leaves no manifest, so it can't be imported by
+    mistake.
+    """
+
+    def __init__(self, path, model_name, settings=None):
+        self.path = path
+        self.model_name = model_name
+        self.settings = settings or {}
+        self.count = 0
+        self.dims = None
+
+        os.makedirs(path, exist_ok=True)
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        self._records = open(os.path.join(path, RECORDS_FILE), "w", encoding="utf-8")
+        self._vectors = open(os.path.join(path, VECTORS_FILE), "wb")
+
+    def add(self, uuid, record, vector):
+        vector = np.asarray(vector, dtype=VECTOR_DTYPE)
+        if self.dims is None:
+            self.dims = int(vector.shape[-1])
+        elif vector.shape[-1] != self.dims:
+            raise ValueError(
+                f"Vector has {vector.shape[-1]} dims, artifact has {self.dims}"
+            )
+        self._records.write(json.dumps({"uuid": uuid, "data_object": record}) + "\n")
+        self._vectors.write(vector.tobytes())
+        self.count += 1
+
+    def close(self, extra=None):
+        self._records.close()
+        self._vectors.close()
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "model_name": self.model_name,
+            "dims": self.dims,
+            "count": self.count,
+            "dtype": VECTOR_DTYPE,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "settings": self.settings,
+            "files": {
+                name: _sha256(os.path.join(self.path, name))
+                for name in (RECORDS_FILE, VECTORS_FILE)
+            },
+            **(extra or {}),
+        }
+        with open(os.path.join(self.path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        print(f"💾 Exported {self.count} vectors to artifact {self.path}")
+        return manifest
+
+
+class ArtifactReader:
+    """Opens an artifact, verifies its checksums and memory-maps the vectors."""
+
+    def __init__(self, path, verify=True):
+        self.path = path
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(
+                f"No {MANIFEST_FILE} in {path} (missing or incomplete artifact)"
+            )
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported artifact format {self.manifest.get('format_version')}"
+            )
+        if verify:
+            self.verify()
+
+        self.count = self.manifest["count"]
+        self.dims = self.manifest["dims"]
+        self.model_name = self.manifest["model_name"]
+        self.vectors = (
+            np.memmap(
+                os.path.join(path, VECTORS_FILE),
+                dtype=self.manifest["dtype"],
+                mode="r",
+                shape=(self.count, self.dims),
+            )
+            if self.count
+            else np.zeros((0, self.dims or 0), dtype=VECTOR_DTYPE)
+        )
+
+    def verify(self):
+        for name, expected in self.manifest["files"].items():
+            actual = _sha256(os.path.join(self.path, name))
+            if actual != expected:
+                raise ValueError(f"❌ Checksum mismatch for {name} in {self.path}")
+
+    def iter_records(self):
+        """Yield (row, uuid, data_object) in vector order."""
+        with open(os.path.join(self.path, RECORDS_FILE), "r", encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                entry = json.loads(line)
+                yield row, entry["uuid"], entry["data_object"]
+
+
+def import_artifact(
+    path,
+    client=None,
+    class_name=None,
+    batch_size=None,
+    import_workers=None,
+    verify=True,
+):
+    """Bulk-import an artifact into Weaviate without running the model."""
+    import core_embedding
+    from weaviate import Client as WeaviateClient
+
+    reader = ArtifactReader(path, verify=verify)
+    settings = reader.manifest.get("settings", {})
+    class_name = class_name or settings.get("class_name", core_embedding.CLASS_NAME)
+    client = client or WeaviateClient(core_embedding.WEAVIATE_URL)
+
+    print(
+        f"📦 Importing {reader.count} precomputed vectors ({reader.model_name}) "
+        f"from {path} into {class_name}"
+    )
+    vector_index_config = settings.get("vector_index_config")
+    tuned_inverted_index = settings.get("tuned_inverted_index", True)
+    partitioner = None
+    if settings.get("partition_by_source"):
+        partitioner = core_embedding.SourcePartitioner(
+            client, class_name, vector_index_config, tuned_inverted_index
+        )
+        partitioner.reset()
+    else:
+        # Partitions of an earlier partitioned import go as well
+        core_embedding.SourcePartitioner(client, class_name).reset()
+        core_embedding.create_schema(
+            client,
+            class_name,
+            vector_index_config,
+            tuned_inverted_index=tuned_inverted_index,
+        )
+    importer = core_embedding.BatchImporter(
+        client,
+        class_name=class_name,
+        batch_size=batch_size or core_embedding.BATCH_SIZE,
+        num_workers=import_workers or core_embedding.IMPORT_WORKERS,
+    )
+    articles = set()
+    filter_stats = core_embedding.FilterStatsBuilder()
+    article_index = core_embedding.ArticleIndexBuilder(class_name)
+    summary_count = 0
+    with importer:
+        for row, uuid, record in reader.iter_records():
+            target = partitioner.class_for(record) if partitioner else None
+            importer.add(record, reader.vectors[row], uuid, target)
+            articles.add(record["article"])
+            filter_stats.add(record)
+            article_index.add(record, uuid, target)
+            summary_count += record.get("doc_type") == "summary"
+    article_index_count = core_embedding.import_article_index(
+        client,
+        article_index,
+        importer.batch_size,
+        importer.num_workers,
+        importer.journal_file,
+    )
+    classes = sorted(partitioner.classes) if partitioner else [class_name]
+    for name in classes:
+        core_embedding.enable_deferred_pq(client, name, vector_index_config)
+    core_embedding.write_index_metadata(
+        client,
+        class_name,
+        chunk_file=reader.manifest.get("chunk_file"),
+        chunk_fingerprint=reader.manifest.get("chunk_fingerprint"),
+        model_name=reader.model_name,
+        embedding_backend=settings.get("embedding_backend"),
+        classes=classes,
+        partition_by_source=bool(settings.get("partition_by_source")),
+        artifact=path,
+        article_summaries=summary_count,
+        known_articles=sorted(articles),
+        filter_stats=filter_stats.to_dict(),
+        article_index=article_index_count,
+    )
+    print(f"✅ Artifact import complete. {importer.report()}")
+    return importer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precomputed vector artifacts")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    verify = sub.add_parser("verify", help="check manifest and checksums")
+    verify.add_argument("path")
+
+    load = sub.add_parser("import", help="bulk-import into Weaviate")
+    load.add_argument("path")
+    load.add_argument("--class-name")
+    load.add_argument("--weaviate-url")
+    load.add_argument("--batch-size", type=int)
+    load.add_argument("--import-workers", type=int)
+    load.add_argument("--skip-verify", action="store_true")
+
+    args = parser.parse_args(argv)
+    if args.command == "verify":
+        reader = ArtifactReader(args.path)
+        print(
+            f"✅ {args.path}: {reader.count} x {reader.dims} vectors "
+            f"({reader.model_name}), checksums OK"
+        )
+        return
+
+    client = None
+    if args.weaviate_url:
+        from weaviate import Client as WeaviateClient
+
+        client = WeaviateClient(args.weaviate_url)
+    import_artifact(
+        args.path,
+        client=client,
+        class_name=args.class_name,
+        batch_size=args.batch_size,
+        import_workers=args.import_workers,
+        verify=not args.skip_verify,
+    )
+
+
+if __name__ == "__main__":
+    main()